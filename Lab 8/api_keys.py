@@ -0,0 +1,261 @@
+"""
+API Key Store for Lab 8
+=======================
+
+This module replaces the single hard-coded API key with a store of many
+keys, each with a name and a set of scopes (e.g. "data:read", "admin").
+
+- Keys live in a Redis hash ("apikeys") shared by every app instance.
+  Only the SHA-256 digest of a key is stored, never the key itself; the
+  first 32 hex digits of the digest double as the key id.
+- Lookups are served from an in-process TTL cache, so a request normally
+  costs no Redis round trip. Unknown keys are cached too, for a shorter
+  time, so a client retrying a bad key can't hammer Redis. Expired
+  unknown-key entries are purged on every reload, so a stream of bogus
+  keys can't grow the cache without bound.
+- A background thread reloads every key periodically and replaces the
+  cache, so entries rarely expire on the request path.
+- Revoking a key deletes it from Redis and publishes its id on the
+  "apikeys:revoked" channel. Every instance listens on that channel and
+  drops the key from its cache straight away; the periodic reload is the
+  safety net if a message is missed. Every eviction bumps a generation
+  counter, and a load that overlapped an eviction is not cached, so a
+  revoked key read just before its revocation can't be put back.
+
+The bootstrap key (API_KEY in main.py) is always accepted with every
+scope, so the lab works without Redis. It is checked with
+hmac.compare_digest; stored keys are found by their digest, so lookup
+timing says nothing about the raw key.
+"""
+
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import redis
+
+ALL_SCOPES = "*"
+
+
+class ApiKey:
+    """A stored API key: its id, name and scopes."""
+
+    def __init__(self, key_id: str, name: str, scopes: Iterable[str], created: float = 0.0):
+        self.key_id = key_id
+        self.name = name
+        self.scopes: FrozenSet[str] = frozenset(scopes)
+        self.created = created
+
+    def allows(self, scope: str) -> bool:
+        return ALL_SCOPES in self.scopes or scope in self.scopes
+
+    def to_dict(self) -> Dict:
+        return {"key_id": self.key_id, "name": self.name, "scopes": sorted(self.scopes), "created": self.created}
+
+
+def key_id_for(raw_key: str) -> str:
+    """
+    Get the id of a raw API key.
+
+    Args:
+        raw_key: Key as sent in the api-key header
+
+    Returns:
+        First 32 hex digits of the key's SHA-256 digest
+    """
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()[:32]
+
+
+class ApiKeyStore:
+    """API keys in Redis behind an in-process TTL cache."""
+
+    def __init__(self, client: Optional[redis.Redis] = None, bootstrap_key: Optional[str] = None,
+                 ttl: float = 60.0, negative_ttl: float = 5.0, refresh_interval: float = 30.0,
+                 hash_name: str = "apikeys", channel: str = "apikeys:revoked"):
+        """
+        Args:
+            client: Redis client, or None to accept only the bootstrap key
+            bootstrap_key: Key that is always valid with every scope
+            ttl: Seconds a known key stays cached
+            negative_ttl: Seconds an unknown key stays cached
+            refresh_interval: Seconds between background reloads
+            hash_name: Redis hash holding the keys
+            channel: Redis pub/sub channel for revocations
+        """
+        self.client = client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.hash_name = hash_name
+        self.channel = channel
+        self._bootstrap = bootstrap_key.encode("utf-8") if bootstrap_key else None
+        self._cache: Dict[str, Tuple[Optional[ApiKey], float]] = {}
+        # Bumped by every eviction; loads that overlap one are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def authenticate(self, raw_key: Optional[str]) -> Optional[ApiKey]:
+        """
+        Find the key matching a raw api-key header value.
+
+        Args:
+            raw_key: Header value (may be None)
+
+        Returns:
+            ApiKey, or None if the key is missing, unknown or revoked
+        """
+        hit, key = self.authenticate_cached(raw_key)
+        if hit:
+            return key
+        return self._load(key_id_for(raw_key))
+
+    def authenticate_cached(self, raw_key: Optional[str]) -> Tuple[bool, Optional[ApiKey]]:
+        """
+        Like authenticate(), but without going to Redis.
+
+        Async callers use this first and only fall back to authenticate()
+        in the threadpool on a miss.
+
+        Args:
+            raw_key: Header value (may be None)
+
+        Returns:
+            Tuple of (answered without Redis, ApiKey or None)
+        """
+        if not raw_key:
+            return True, None
+        if self._bootstrap is not None and hmac.compare_digest(raw_key.encode("utf-8"), self._bootstrap):
+            return True, ApiKey("bootstrap", "bootstrap", [ALL_SCOPES])
+        if self.client is None:
+            return True, None
+        entry = self._cache.get(key_id_for(raw_key))
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def _load(self, key_id: str) -> Optional[ApiKey]:
+        generation = self._generation
+        try:
+            raw = self.client.hget(self.hash_name, key_id)
+        except redis.RedisError as err:
+            # Don't cache the miss: the key may well be valid
+            print(f"API key store: Redis unavailable ({err})")
+            return None
+        key = _decode(key_id, raw) if raw is not None else None
+        with self._lock:
+            if self._generation == generation:
+                self._cache[key_id] = (key, time.monotonic() + (self.ttl if key else self.negative_ttl))
+        return key
+
+    def create_key(self, name: str, scopes: Iterable[str]) -> Tuple[str, ApiKey]:
+        """
+        Create and store a new random key.
+
+        Args:
+            name: Human-readable owner, e.g. "reporting-service"
+            scopes: Scopes the key grants
+
+        Returns:
+            Tuple of (raw key, ApiKey). The raw key is not stored and
+            cannot be recovered later.
+        """
+        raw_key = secrets.token_urlsafe(32)
+        key = ApiKey(key_id_for(raw_key), name, scopes, time.time())
+        self.client.hset(self.hash_name, key.key_id, json.dumps(
+            {"name": key.name, "scopes": sorted(key.scopes), "created": key.created}))
+        self._evict(key.key_id)
+        return raw_key, key
+
+    def revoke(self, key_id: str) -> bool:
+        """
+        Revoke a key on every instance.
+
+        Args:
+            key_id: Id of the key to revoke
+
+        Returns:
+            True if the key existed
+        """
+        removed = self.client.hdel(self.hash_name, key_id)
+        self.client.publish(self.channel, key_id)
+        self._evict(key_id)
+        return bool(removed)
+
+    def list_keys(self) -> List[ApiKey]:
+        """List every stored key (without the bootstrap key)."""
+        raw = self.client.hgetall(self.hash_name)
+        return [_decode(_text(key_id), value) for key_id, value in raw.items()]
+
+    def refresh(self) -> None:
+        """Reload every key from Redis and replace the cache."""
+        generation = self._generation
+        keys = self.list_keys()
+        now = time.monotonic()
+        with self._lock:
+            if self._generation != generation:
+                # A key was revoked or created meanwhile; the next reload catches up
+                return
+            # Unknown-key entries that are still fresh are kept
+            negatives = {k: v for k, v in self._cache.items() if v[0] is None and v[1] >= now}
+            self._cache = {**negatives, **{key.key_id: (key, now + self.ttl) for key in keys}}
+
+    def _evict(self, key_id: str) -> None:
+        with self._lock:
+            self._cache.pop(key_id, None)
+            self._generation += 1
+
+    def start(self) -> None:
+        """Start the background refresh and revocation listener threads."""
+        if self.client is None or self._threads:
+            return
+        self._stop.clear()
+        for target, name in ((self._refresh_loop, "apikey-refresh"), (self._listen_loop, "apikey-revocations")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except redis.RedisError as err:
+                # Keep serving the current cache until Redis is back
+                print(f"API key store: refresh failed ({err})")
+            self._stop.wait(self.refresh_interval)
+
+    def _listen_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Reload after (re)subscribing, in case revocations were missed
+                self.refresh()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._evict(_text(message["data"]))
+                pubsub.close()
+            except redis.RedisError as err:
+                print(f"API key store: revocation listener failed ({err})")
+                self._stop.wait(self.refresh_interval)
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _decode(key_id: str, raw) -> ApiKey:
+    data = json.loads(raw)
+    return ApiKey(key_id, data.get("name", ""), data.get("scopes", []), data.get("created", 0.0))
@@ -0,0 +1,112 @@
+"""
+Batch Computation for Lab 8
+===========================
+
+This module computes cubes, powers, sums and rectangle areas for whole
+arrays of inputs at once, for the /batch/* endpoints.
+
+When NumPy is installed and every input and result fits in a 64-bit
+machine type, the whole array is computed with one vectorized NumPy
+operation. Otherwise the batch falls back to Python integers, which never
+overflow. Both paths return plain Python lists with identical values, so
+callers can't tell which one ran.
+
+The overflow checks are done before computing, on the largest input, so
+a batch is never computed twice.
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INT64_MAX = 2 ** 63 - 1
+
+# Batches smaller than this are faster in plain Python than the cost of
+# converting them to and from NumPy arrays
+NUMPY_MIN_ITEMS = 32
+
+
+def _use_numpy(count: int) -> bool:
+    return np is not None and count >= NUMPY_MIN_ITEMS
+
+
+def _max_abs(values: Sequence[int]) -> int:
+    return max((abs(v) for v in values), default=0)
+
+
+def _power_fits_int64(max_abs: int, exp: int) -> bool:
+    """Check that max_abs ** exp fits in an int64 without computing a huge number."""
+    if max_abs <= 1:
+        return True
+    if exp * math.log2(max_abs) > 64:
+        return False
+    return max_abs ** exp <= INT64_MAX
+
+
+def cube_many(numbers: Sequence[int]) -> List[int]:
+    """
+    Cube every number.
+
+    Args:
+        numbers: Integers of any size
+
+    Returns:
+        List of cubes, in input order
+    """
+    if _use_numpy(len(numbers)) and _power_fits_int64(_max_abs(numbers), 3):
+        array = np.asarray(numbers, dtype=np.int64)
+        return (array * array * array).tolist()
+    return [n ** 3 for n in numbers]
+
+
+def power_many(bases: Sequence[int], exp: int) -> List:
+    """
+    Raise every base to the same exponent.
+
+    Args:
+        bases: Integers of any size
+        exp: Exponent; a negative exponent gives float results, like /power
+
+    Returns:
+        List of results, in input order
+    """
+    if exp >= 0 and _use_numpy(len(bases)) and _power_fits_int64(_max_abs(bases), exp):
+        return np.power(np.asarray(bases, dtype=np.int64), exp).tolist()
+    return [base ** exp for base in bases]
+
+
+def add_many(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    """
+    Add two arrays element by element.
+
+    Args:
+        a: First addends
+        b: Second addends (same length as a)
+
+    Returns:
+        List of sums, in input order
+    """
+    # Both operands below 2**62 means the sum is below 2**63
+    if _use_numpy(len(a)) and max(_max_abs(a), _max_abs(b)) < 2 ** 62:
+        return np.add(np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)).tolist()
+    return [x + y for x, y in zip(a, b)]
+
+
+def area_many(rectangles: Sequence[Tuple[float, float]]) -> List[float]:
+    """
+    Compute the area of every rectangle.
+
+    Args:
+        rectangles: (width, height) pairs
+
+    Returns:
+        List of areas, in input order
+    """
+    if _use_numpy(len(rectangles)):
+        array = np.asarray(rectangles, dtype=np.float64).reshape(-1, 2)
+        return (array[:, 0] * array[:, 1]).tolist()
+    return [width * height for width, height in rectangles]
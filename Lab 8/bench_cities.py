@@ -0,0 +1,46 @@
+"""
+City Lookup Benchmark for Lab 8
+===============================
+
+Measures exact, autocomplete and fuzzy lookup time in CityIndex for
+synthetic datasets of growing size, to check that autocomplete latency
+stays flat as the number of cities grows.
+
+Usage: python bench_cities.py [iterations]
+"""
+
+import random
+import string
+import sys
+import timeit
+
+from cities import City, CityIndex, load_cities
+
+
+def synthetic_cities(count: int, seed: int = 8):
+    """Build `count` random city names on top of the real data file."""
+    rng = random.Random(seed)
+    cities = list(load_cities().cities)
+    while len(cities) < count:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))).title()
+                 for _ in range(rng.randint(1, 2))]
+        cities.append(City(" ".join(words), "Synthetic city."))
+    return cities
+
+
+def main_benchmark(iterations: int = 10000) -> None:
+    """Index each dataset size and print the time per lookup."""
+    print(f"{'cities':>8}{'build':>10}{'exact':>12}{'prefix':>12}{'fuzzy':>12}")
+    for count in (1000, 10000, 100000):
+        cities = synthetic_cities(count)
+        build = timeit.timeit(lambda: CityIndex(cities), number=1)
+        index = CityIndex(cities)
+        timings = []
+        for lookup, query in ((index.get, "New York"), (index.autocomplete, "bo"), (index.fuzzy, "Bostn")):
+            number = iterations if lookup != index.fuzzy else max(10, iterations // 100)
+            timings.append(timeit.timeit(lambda: lookup(query), number=number) / number * 1e6)
+        print(f"{count:>8}{build:>9.2f}s" + "".join(f"{t:>9.1f} us" for t in timings))
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
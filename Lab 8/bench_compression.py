@@ -0,0 +1,60 @@
+"""
+Response Compression Benchmark for Lab 8
+========================================
+
+Measures bytes-on-wire and CPU time per response for each gzip level and
+brotli quality on bodies produced by the existing routes. Use the output to
+pick COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY and
+COMPRESSION_MIN_SIZE for the app.
+
+Usage: python bench_compression.py [iterations]
+"""
+
+import asyncio
+import json
+import sys
+import timeit
+
+import main
+from compression import brotli, compress_body
+from serialization import get_response_class
+
+
+def build_bodies():
+    """Render response bodies for a few representative routes."""
+    response_class = get_response_class()
+    report_lines = "".join(
+        json.dumps({"product_name": f"Guitar {i}", "list_price": 699.99 + i, "discount_percent": 30.0}) + "\n"
+        for i in range(1000)
+    )
+    return {
+        "/cube/3": response_class(asyncio.run(main.cube(3))).body,
+        "/factorial/1000": response_class(asyncio.run(main.factorial(1000))).body,
+        "/factorial/5000": response_class(asyncio.run(main.factorial(5000))).body,
+        "/power/7?exp=20000": response_class(asyncio.run(main.power(7, 20000))).body,
+        "report ndjson (1000)": report_lines.encode("utf-8"),
+    }
+
+
+def main_benchmark(iterations: int = 200) -> None:
+    """Compress every body at every setting and print size and time."""
+    settings = [("gzip", level) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings += [("br", quality) for quality in (1, 4, 6, 11)]
+    else:
+        print("brotli is not installed; only gzip is measured.")
+
+    for label, body in build_bodies().items():
+        print(f"\n{label}: {len(body)} bytes uncompressed")
+        print(f"  {'setting':<10}{'bytes':>10}{'ratio':>8}{'time':>14}")
+        for encoding, level in settings:
+            kwargs = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+            compressed = compress_body(body, encoding, **kwargs)
+            count = max(5, iterations // 20) if encoding == "br" and level >= 10 else iterations
+            seconds = timeit.timeit(lambda: compress_body(body, encoding, **kwargs), number=count)
+            print(f"  {encoding + '-' + str(level):<10}{len(compressed):>10}"
+                  f"{len(body) / len(compressed):>7.1f}x{seconds / count * 1e6:>11.1f} us")
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
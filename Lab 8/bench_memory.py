@@ -0,0 +1,131 @@
+"""
+MinIO Memory Benchmark for Lab 8
+================================
+
+Uploads and downloads objects of several sizes and prints the peak RSS
+(resident memory) of each transfer method:
+
+- BytesIO upload: the file read into bytes and wrapped in a BytesIO
+  (what cli_driver.py used to do)
+- upload_file: storage.upload_file(), read one part at a time
+- upload_mapped: storage.upload_mapped(), parts copied from an mmap
+- read() download: get_object().read() of the whole object
+- download_file: storage.download_file() with one stream
+- download_mapped: storage.download_mapped(), read straight into an mmap
+
+Every measurement runs in a fresh Python process, because the peak RSS
+of a process only ever goes up. The numbers are the growth over the RSS
+of that process before the transfer.
+
+Start MinIO first (docker compose up minio).
+
+Usage: python bench_memory.py [sizes_mb]   (e.g. 64,256,512)
+"""
+
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from storage import (download_file, download_mapped, ensure_bucket, get_client, upload_file,
+                     upload_mapped)
+
+BUCKET = "lab8-bench"
+
+
+def _peak_rss() -> int:
+    """Peak RSS of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def bytesio_upload(path: str, object_name: str) -> None:
+    with open(path, "rb") as f:
+        data = f.read()
+    get_client().put_object(BUCKET, object_name, io.BytesIO(data), len(data))
+
+
+def read_download(object_name: str, path: str) -> None:
+    response = get_client().get_object(BUCKET, object_name)
+    try:
+        data = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+METHODS = {
+    "BytesIO upload": lambda path, name: bytesio_upload(path, name),
+    "upload_file": lambda path, name: upload_file(BUCKET, name, path),
+    "upload_mapped": lambda path, name: upload_mapped(BUCKET, name, path),
+    "read() download": lambda path, name: read_download(name, path),
+    "download_file": lambda path, name: download_file(BUCKET, name, path, workers=1),
+    "download_mapped": lambda path, name: download_mapped(BUCKET, name, path),
+}
+
+
+def run_child(method: str, path: str, object_name: str) -> None:
+    """Run one transfer and print: seconds, RSS growth in bytes."""
+    get_client().bucket_exists(BUCKET)  # connect before taking the baseline
+    before = _peak_rss()
+    start = time.perf_counter()
+    METHODS[method](path, object_name)
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed} {_peak_rss() - before}")
+
+
+def _measure(method: str, path: str, object_name: str):
+    output = subprocess.run([sys.executable, __file__, "--child", method, path, object_name],
+                            check=True, capture_output=True, text=True).stdout.split()
+    return float(output[0]), int(output[1])
+
+
+def _write_random_file(path: str, size: int) -> None:
+    chunk = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for offset in range(0, size, len(chunk)):
+            f.write(chunk[:size - offset])
+
+
+def main_benchmark(sizes_mb=(64, 256, 512)) -> None:
+    """Print the peak RSS growth of every method for every object size."""
+    ensure_bucket(BUCKET)
+    results = {method: [] for method in METHODS}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes_mb:
+            source = os.path.join(tmp, "source.bin")
+            target = os.path.join(tmp, "target.bin")
+            _write_random_file(source, size_mb * 1024 * 1024)
+            for method in METHODS:
+                upload = "upload" in method
+                path = source if upload else target
+                # Uploads write their own object; downloads read the mapped upload
+                object_name = f"{method.split()[0].strip('()')}.bin" if upload else "upload_mapped.bin"
+                elapsed, growth = _measure(method, path, object_name)
+                results[method].append((size_mb / elapsed, growth))
+            os.remove(source)
+            if os.path.exists(target):
+                os.remove(target)
+
+    print("Peak RSS growth (throughput)")
+    print(f"  {'method':<18}" + "".join(f"{f'{size} MiB':>22}" for size in sizes_mb))
+    for method, row in results.items():
+        cells = "".join(f"{f'{growth / 1024 / 1024:.0f} MiB ({speed:.0f} MiB/s)':>22}" for speed, growth in row)
+        print(f"  {method:<18}{cells}")
+
+    client = get_client()
+    for name in ("BytesIO.bin", "upload_file.bin", "upload_mapped.bin"):
+        client.remove_object(BUCKET, name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:5])
+    else:
+        main_benchmark(tuple(int(size) for size in sys.argv[1].split(",")) if len(sys.argv) > 1 else (64, 256, 512))
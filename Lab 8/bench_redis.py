@@ -0,0 +1,88 @@
+"""
+Redis Round Trip Benchmark for Lab 8
+====================================
+
+Writes and reads many keys two ways and prints the operations per second
+of each, then compares listing the keys with KEYS and with SCAN:
+
+- One command per round trip: r.set() / r.get() for every key (what
+  cli_driver.py used to do)
+- redis_utils.py: mset_batched() / mget_batched(), all keys in one pipeline
+- KEYS *: one call that blocks Redis until every key has been matched
+- SCAN: redis_utils.scan_keys(), many short calls; the longest single call
+  is how long other clients may have to wait
+
+Start Redis first (docker compose up redis).
+
+Usage: python bench_redis.py [keys] [batch_size] [scan_count]
+"""
+
+import sys
+import time
+
+from redis_utils import get_client, mget_batched, mset_batched, scan_keys, delete_matching
+
+PREFIX = "bench:redis:"
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:>12,.0f} ops/s"
+
+
+def main_benchmark(keys: int = 10000, batch_size: int = 500, scan_count: int = 1000) -> None:
+    """Run both patterns and print ops/sec, then KEYS vs SCAN latency."""
+    r = get_client()
+    delete_matching(r, f"{PREFIX}*")
+    mapping = {f"{PREFIX}{i}": f"value-{i}" for i in range(keys)}
+    names = list(mapping)
+
+    start = time.perf_counter()
+    for key, value in mapping.items():
+        r.set(key, value)
+    set_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    single = [r.get(key) for key in names]
+    get_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mset_batched(r, mapping, batch_size=batch_size)
+    mset_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    batched = mget_batched(r, names, batch_size=batch_size)
+    mget_seconds = time.perf_counter() - start
+    assert batched == single
+
+    print(f"{keys} keys, batches of {batch_size}")
+    print(f"  {'SET, one round trip each':<36}{_rate(keys, set_seconds)}")
+    print(f"  {'GET, one round trip each':<36}{_rate(keys, get_seconds)}")
+    print(f"  {'mset_batched (1 pipeline)':<36}{_rate(keys, mset_seconds)}")
+    print(f"  {'mget_batched (1 pipeline)':<36}{_rate(keys, mget_seconds)}")
+
+    start = time.perf_counter()
+    listed = r.keys(f"{PREFIX}*")
+    keys_seconds = time.perf_counter() - start
+
+    # Time every SCAN call, to find the longest Redis is busy with one
+    longest = 0.0
+    cursor = 0
+    start = time.perf_counter()
+    while True:
+        call = time.perf_counter()
+        cursor, found = r.scan(cursor, match=f"{PREFIX}*", count=scan_count)
+        longest = max(longest, time.perf_counter() - call)
+        if cursor == 0:
+            break
+    scan_seconds = time.perf_counter() - start
+    assert set(scan_keys(r, f"{PREFIX}*", scan_count)) == set(listed)
+
+    print(f"Listing {len(listed)} keys (SCAN count={scan_count})")
+    print(f"  {'KEYS *':<36}{keys_seconds * 1000:>9.1f} ms total, {keys_seconds * 1000:.1f} ms in one call")
+    print(f"  {'SCAN':<36}{scan_seconds * 1000:>9.1f} ms total, {longest * 1000:.1f} ms longest call")
+
+    delete_matching(r, f"{PREFIX}*")
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+                   int(sys.argv[2]) if len(sys.argv) > 2 else 500,
+                   int(sys.argv[3]) if len(sys.argv) > 3 else 1000)
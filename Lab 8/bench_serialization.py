@@ -0,0 +1,116 @@
+"""
+JSON Serializer Benchmark for Lab 8
+===================================
+
+Compares the JSON response classes in serialization.py against FastAPI's
+stock JSONResponse on payloads produced by the existing routes, including
+huge integer results from /factorial and /power and a report-sized result
+set with Decimal prices.
+
+Every payload is requested through a FastAPI app using each response
+class, so the timings include what the app really does per response:
+routing, FastAPI's jsonable_encoder and rendering. Requests are sent
+straight to the ASGI app, without a server or HTTP client in between.
+
+Usage: python bench_serialization.py [iterations]
+"""
+
+import asyncio
+import sys
+import time
+from decimal import Decimal
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+import main
+from serialization import RESPONSE_CLASSES, available_serializers
+
+
+def build_payloads():
+    """Build one response payload per scenario by calling the route handlers."""
+    report_rows = [
+        {"product_name": f"Guitar {i}", "list_price": Decimal("699.99") + i, "discount_percent": Decimal("30.00")}
+        for i in range(1000)
+    ]
+    return {
+        "/cube/3": asyncio.run(main.cube(3)),
+        "/colors": asyncio.run(main.list_colors()),
+        "/city/Boston": asyncio.run(main.city_info("Boston")),
+        "/factorial/20": asyncio.run(main.factorial(20)),
+        "/factorial/500": asyncio.run(main.factorial(500)),
+        "/factorial/3000": asyncio.run(main.factorial(3000)),
+        "/power/2?exp=200": asyncio.run(main.power(2, 200)),
+        "report (1000 rows)": {"report": "simple_3", "rows": report_rows},
+    }
+
+
+def build_app(response_class, payloads) -> FastAPI:
+    """An app with one route per payload, rendered with `response_class`."""
+    app = FastAPI(default_response_class=response_class)
+    for i, payload in enumerate(payloads.values()):
+        app.add_api_route(f"/{i}", returning(payload))
+    return app
+
+
+def returning(payload):
+    """A route handler without parameters that returns `payload`."""
+    async def route():
+        return payload
+    return route
+
+
+async def request(app: FastAPI, path: str) -> int:
+    """Send one GET straight to the ASGI app and return the status code."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode("ascii"), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def time_requests(app: FastAPI, path: str, count: int) -> float:
+    """Average seconds per request, or None if the app fails to render the payload."""
+    if await request(app, path) != 200:
+        return None
+    start = time.perf_counter()
+    for _ in range(count):
+        await request(app, path)
+    return (time.perf_counter() - start) / count
+
+
+def main_benchmark(iterations: int = 2000) -> None:
+    """Time every response class on every payload and print a results table."""
+    payloads = build_payloads()
+    response_classes = {"fastapi-default": JSONResponse}
+    response_classes.update({name: RESPONSE_CLASSES[name] for name in available_serializers()})
+    apps = {name: build_app(response_class, payloads) for name, response_class in response_classes.items()}
+
+    print(f"{'payload':<22}" + "".join(f"{name:>18}" for name in apps))
+    for i, label in enumerate(payloads):
+        # Large payloads get fewer iterations so each cell takes similar time
+        count = max(10, iterations // 50) if label.startswith(("report", "/factorial/3000")) else iterations
+        cells = []
+        for app in apps.values():
+            try:
+                seconds = asyncio.run(time_requests(app, f"/{i}", count))
+            except ValueError:
+                # The stock encoder cannot print ints over the digit limit
+                seconds = None
+            cells.append(f"{'FAILS':>18}" if seconds is None else f"{seconds * 1e6:>15.1f} us")
+        print(f"{label:<22}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
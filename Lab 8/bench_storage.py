@@ -0,0 +1,109 @@
+"""
+MinIO Transfer Benchmark for Lab 8
+==================================
+
+Uploads and downloads one large object (1 GiB by default) two ways and
+prints the throughput and the peak Python memory of each:
+
+- Naive: a new Minio client per call, put_object() from an in-memory
+  BytesIO of the whole file, and get_object().read() of the whole object
+  (what cli_driver.py used to do)
+- storage.py: the shared client, a streaming multipart upload with
+  parallel parts, then a chunked download to disk over one stream and
+  a parallel ranged download
+
+Start MinIO first (docker compose up minio).
+
+Usage: python bench_storage.py [size_mb] [part_size_mb] [workers]
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from minio import Minio
+
+from storage import download_file, ensure_bucket, get_client, upload_file
+
+BUCKET = "lab8-bench"
+
+
+def _write_random_file(path: str, size: int) -> None:
+    chunk = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for offset in range(0, size, len(chunk)):
+            f.write(chunk[:size - offset])
+
+
+def _new_client() -> Minio:
+    return Minio(os.environ.get("MINIO_ENDPOINT", "localhost:9000"),
+                 access_key=os.environ.get("MINIO_ACCESS_KEY", "minioadmin"),
+                 secret_key=os.environ.get("MINIO_SECRET_KEY", "minioadmin123"),
+                 secure=False)
+
+
+def _measure(func):
+    """Run func and return (seconds, peak traced memory in bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def naive_upload(source: str, object_name: str) -> None:
+    with open(source, "rb") as f:
+        data = f.read()
+    _new_client().put_object(BUCKET, object_name, io.BytesIO(data), len(data))
+
+
+def naive_download(object_name: str, target: str) -> None:
+    response = _new_client().get_object(BUCKET, object_name)
+    try:
+        data = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+    with open(target, "wb") as f:
+        f.write(data)
+
+
+def main_benchmark(size_mb: int = 1024, part_size_mb: int = 16, workers: int = 4) -> None:
+    """Run both transfer methods and print MB/s and peak memory."""
+    size = size_mb * 1024 * 1024
+    part_size = part_size_mb * 1024 * 1024
+    ensure_bucket(BUCKET)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.bin")
+        target = os.path.join(tmp, "target.bin")
+        _write_random_file(source, size)
+
+        runs = {
+            "naive upload": lambda: naive_upload(source, "naive.bin"),
+            "naive download": lambda: naive_download("naive.bin", target),
+            f"multipart upload ({part_size_mb} MiB x {workers})": lambda: upload_file(
+                BUCKET, "multipart.bin", source, part_size=part_size, workers=workers),
+            "chunked download (1 stream)": lambda: download_file(
+                BUCKET, "multipart.bin", target, workers=1),
+            f"parallel download ({part_size_mb} MiB x {workers})": lambda: download_file(
+                BUCKET, "multipart.bin", target, part_size=part_size, workers=workers),
+        }
+        print(f"{size_mb} MiB object")
+        for label, func in runs.items():
+            elapsed, peak = _measure(func)
+            print(f"  {label:<36}{size_mb / elapsed:>8.1f} MiB/s  peak {peak / 1024 / 1024:>8.1f} MiB")
+
+    client = get_client()
+    for name in ("naive.bin", "multipart.bin"):
+        client.remove_object(BUCKET, name)
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1024,
+                   int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+                   int(sys.argv[3]) if len(sys.argv) > 3 else 4)
@@ -0,0 +1,79 @@
+"""
+WebSocket vs REST Benchmark for Lab 8
+=====================================
+
+Measures messages per second for small computations (/add and /cube)
+sent to a running app three ways:
+
+- REST: one HTTP request per operation over a keep-alive connection
+- WebSocket: one frame per operation on /ws/compute, waiting for each reply
+- WebSocket batched: frames of `batch` operations as a JSON array
+
+Start the app with rate limits raised first, or the limiter will throttle
+the benchmark:
+
+    RATE_LIMIT_IP_BURST=1000000 RATE_LIMIT_IP_PER_SECOND=1000000 \\
+        uvicorn main:app --port 8080
+
+Usage: python bench_websocket.py [operations] [base_url]
+"""
+
+import json
+import sys
+import time
+
+import requests
+from websockets.sync.client import connect
+
+
+def bench_rest(base_url: str, operations: int) -> float:
+    with requests.Session() as session:
+        start = time.perf_counter()
+        for i in range(operations):
+            if i % 2:
+                session.get(f"{base_url}/cube/{i}").raise_for_status()
+            else:
+                session.get(f"{base_url}/add", params={"a": i, "b": 1}).raise_for_status()
+        return operations / (time.perf_counter() - start)
+
+
+def _operation(i: int) -> dict:
+    return {"op": "cube", "number": i, "id": i} if i % 2 else {"op": "add", "a": i, "b": 1, "id": i}
+
+
+def bench_websocket(ws_url: str, operations: int) -> float:
+    with connect(ws_url) as ws:
+        start = time.perf_counter()
+        for i in range(operations):
+            ws.send(json.dumps(_operation(i)))
+            if "error" in json.loads(ws.recv()):
+                raise RuntimeError("WebSocket operation failed (rate limited?)")
+        return operations / (time.perf_counter() - start)
+
+
+def bench_websocket_batched(ws_url: str, operations: int, batch: int = 100) -> float:
+    with connect(ws_url) as ws:
+        start = time.perf_counter()
+        for first in range(0, operations, batch):
+            ws.send(json.dumps([_operation(i) for i in range(first, min(first + batch, operations))]))
+            if any("error" in result for result in json.loads(ws.recv())):
+                raise RuntimeError("WebSocket operation failed (rate limited?)")
+        return operations / (time.perf_counter() - start)
+
+
+def main_benchmark(operations: int = 5000, base_url: str = "http://localhost:8080") -> None:
+    """Run each transport and print messages per second."""
+    ws_url = base_url.replace("http", "ws", 1) + "/ws/compute"
+    results = {
+        "REST": bench_rest(base_url, operations),
+        "WebSocket": bench_websocket(ws_url, operations),
+        "WebSocket batched (100)": bench_websocket_batched(ws_url, operations),
+    }
+    print(f"{operations} operations (alternating add and cube)")
+    for label, rate in results.items():
+        print(f"  {label:<26}{rate:>10.0f} msg/s  {rate / results['REST']:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+                   sys.argv[2] if len(sys.argv) > 2 else "http://localhost:8080")
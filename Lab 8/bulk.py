@@ -0,0 +1,163 @@
+"""
+Bulk Record Validation for Lab 8
+================================
+
+This module validates large batches of records for bulk endpoints such as
+POST /person/bulk, without a Python-level loop per record:
+
+- A JSON array body is validated in one call with a Pydantic TypeAdapter,
+  which parses and validates the whole array in pydantic-core.
+- An NDJSON body is read as a stream and validated in batches of lines.
+  Each batch is joined into one JSON array and validated in one call, so
+  memory stays bounded however many records are sent. Only when a batch
+  contains an invalid line are its lines validated one at a time, so the
+  bad lines can be reported and the good ones still processed. Batches
+  are validated in the thread pool, off the event loop, and a line longer
+  than max_line_bytes stops the upload instead of being buffered.
+
+NDJSON results are written to a spooled temporary file while the upload
+is read, and streamed back afterwards with iter_spooled().
+"""
+
+from typing import IO, Any, AsyncIterator, Callable, Iterator, List, Optional, Tuple, Type
+
+from pydantic import TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+
+class LineTooLongError(ValueError):
+    """An NDJSON line is longer than the validator accepts."""
+
+
+def describe_error(error: ValidationError) -> str:
+    """Summarize a validation error as "field: message" for the first problem."""
+    first = error.errors(include_url=False)[0]
+    field = ".".join(str(part) for part in first["loc"])
+    return f"{field}: {first['msg']}" if field else first["msg"]
+
+
+class BulkValidator:
+    """Validates JSON arrays and NDJSON streams of one model."""
+
+    def __init__(self, model: Type, batch_size: int = 1000, max_line_bytes: int = 64 * 1024):
+        """
+        Args:
+            model: Pydantic model for one record
+            batch_size: NDJSON lines validated per call
+            max_line_bytes: Longest NDJSON line accepted
+        """
+        self.batch_size = batch_size
+        self.max_line_bytes = max_line_bytes
+        self._one = TypeAdapter(model)
+        self._many = TypeAdapter(List[model])
+
+    def validate_array(self, body: bytes) -> List[Any]:
+        """
+        Validate a JSON array body.
+
+        Args:
+            body: Raw request body
+
+        Returns:
+            List of model instances
+
+        Raises:
+            ValidationError: If the body is not an array of valid records
+        """
+        return self._many.validate_json(body)
+
+    def _validate_lines(self, lines: List[Tuple[int, bytes]]) -> List[Tuple[int, Any, Optional[str]]]:
+        try:
+            records = self._many.validate_json(b"[" + b",".join(line for _, line in lines) + b"]")
+            # A line holding several comma-separated objects would shift the
+            # records, so the batch result is only used if the counts match
+            if len(records) == len(lines):
+                return [(number, record, None) for (number, _), record in zip(lines, records)]
+        except ValidationError:
+            pass
+        results = []
+        for number, line in lines:
+            try:
+                results.append((number, self._one.validate_json(line), None))
+            except ValidationError as error:
+                results.append((number, None, describe_error(error)))
+        return results
+
+    async def iter_ndjson(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Tuple[int, Any, Optional[str]]]]:
+        """
+        Validate an NDJSON stream batch by batch.
+
+        Args:
+            chunks: Raw body chunks, e.g. request.stream()
+
+        Yields:
+            Lists of (line number, record or None, error or None), in input order.
+            Blank lines are skipped but still counted.
+
+        Raises:
+            LineTooLongError: If a line is longer than max_line_bytes
+        """
+        buffer = b""
+        number = 0
+        lines: List[Tuple[int, bytes]] = []
+        async for chunk in chunks:
+            # Only the new chunk is split; the partial line before it is joined on
+            *complete, rest = chunk.split(b"\n")
+            if complete:
+                complete[0] = buffer + complete[0]
+                buffer = rest
+            else:
+                buffer += rest
+            for line in complete:
+                number += 1
+                self._check_length(number, line)
+                if line.strip():
+                    lines.append((number, line))
+            self._check_length(number + 1, buffer)
+            while len(lines) >= self.batch_size:
+                yield await run_in_threadpool(self._validate_lines, lines[:self.batch_size])
+                lines = lines[self.batch_size:]
+        if buffer.strip():
+            lines.append((number + 1, buffer))
+        if lines:
+            yield await run_in_threadpool(self._validate_lines, lines)
+
+    def _check_length(self, number: int, line: bytes) -> None:
+        if len(line) > self.max_line_bytes:
+            raise LineTooLongError(f"Line {number} is longer than {self.max_line_bytes} bytes.")
+
+
+def encode_ndjson(items: List[Any], dumps: Callable[[Any], bytes]) -> bytes:
+    """
+    Encode a list of values as NDJSON.
+
+    Args:
+        items: JSON-serializable values
+        dumps: Encoder returning bytes, e.g. serialization.get_dumps()
+
+    Returns:
+        One line per item, each ending in a newline
+    """
+    return b"".join(dumps(item) + b"\n" for item in items)
+
+
+def iter_spooled(file: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Stream a spooled results file from the start, closing it at the end.
+
+    Args:
+        file: File the results were written to
+        chunk_size: Bytes per yielded chunk
+
+    Returns:
+        Iterator of chunks
+    """
+    try:
+        file.seek(0)
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
@@ -0,0 +1,180 @@
+"""
+City Knowledge Base for Lab 8
+=============================
+
+This module loads the city facts behind /city/{city_name} and
+/cities/autocomplete once, when the app starts, and builds three indexes:
+
+- an exact index on normalized names, where case, accents, spaces and
+  punctuation are ignored ("New York", "new-york" and "NEWYORK" all
+  match), plus any aliases listed in the data file ("NYC");
+- a prefix trie for autocomplete. Every trie node stores its best
+  completions in advance, so a lookup only walks the typed prefix.
+  Its cost depends on the prefix length, not on the number of cities;
+- a trigram index for fuzzy lookup of misspelled names ("Bostn"). Only
+  cities that share a trigram with the query are scored.
+
+The data file is a JSON list of {"name", "info", "state", "aliases"}
+objects (cities.json by default, or the CITY_DATA_PATH variable).
+"""
+
+import json
+import os
+import unicodedata
+from typing import Dict, List, Optional, Set
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities.json")
+
+
+def normalize(name: str) -> str:
+    """
+    Normalize a city name for lookup.
+
+    Args:
+        name: Name as typed, e.g. "São Paulo" or "new-york"
+
+    Returns:
+        Lower-case ASCII letters and digits only, e.g. "saopaulo"
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(c for c in decomposed if c.isascii() and c.isalnum()).lower()
+
+
+def trigrams(key: str) -> Set[str]:
+    """Get the trigrams of a normalized key, padded so short keys still have some."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class City:
+    """One city and its facts."""
+
+    def __init__(self, name: str, info: str, state: str = "", aliases: Optional[List[str]] = None):
+        self.name = name
+        self.info = info
+        self.state = state
+        self.aliases = list(aliases or [])
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"name": self.name, "state": self.state, "info": self.info}
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Indexes into CityIndex.cities, best completions first
+        self.top: List[int] = []
+
+
+class CityIndex:
+    """Exact, prefix and fuzzy lookup over a list of cities."""
+
+    def __init__(self, cities: List[City], max_suggestions: int = 10):
+        """
+        Args:
+            cities: Cities to index; earlier entries rank higher in autocomplete
+            max_suggestions: Completions stored per trie node (autocomplete limit)
+        """
+        self.cities = cities
+        self.max_suggestions = max_suggestions
+        self._exact: Dict[str, int] = {}
+        self._trie = _TrieNode()
+        # Fuzzy lookup works on every indexed name: trigram -> name ids,
+        # plus the owning city and trigram count of each name id
+        self._trigrams: Dict[str, List[int]] = {}
+        self._name_city: List[int] = []
+        self._name_sizes: List[int] = []
+
+        for i, city in enumerate(cities):
+            keys = sorted({normalize(name) for name in [city.name] + city.aliases} - {""})
+            for key in keys:
+                self._exact.setdefault(key, i)
+                self._insert(key, i)
+                grams = trigrams(key)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, []).append(len(self._name_city))
+                self._name_city.append(i)
+                self._name_sizes.append(len(grams))
+
+    def _insert(self, key: str, index: int) -> None:
+        node = self._trie
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            # Cities are inserted in rank order, so the first ones seen are kept
+            if len(node.top) < self.max_suggestions and index not in node.top:
+                node.top.append(index)
+
+    def get(self, name: str) -> Optional[City]:
+        """Find a city by its name or an alias, ignoring case, accents and punctuation."""
+        index = self._exact.get(normalize(name))
+        return self.cities[index] if index is not None else None
+
+    def autocomplete(self, prefix: str, limit: int = 5) -> List[City]:
+        """
+        Find cities whose name or alias starts with a prefix.
+
+        Args:
+            prefix: Text typed so far
+            limit: Maximum number of suggestions (at most max_suggestions)
+
+        Returns:
+            Matching cities, best first
+        """
+        key = normalize(prefix)
+        if not key:
+            return []
+        node = self._trie
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self.cities[i] for i in node.top[:limit]]
+
+    def fuzzy(self, name: str, min_score: float = 0.5) -> Optional[City]:
+        """
+        Find the closest city to a possibly misspelled name.
+
+        Args:
+            name: Name as typed
+            min_score: Minimum Dice similarity of the trigram sets (0 to 1)
+
+        Returns:
+            Best matching city, or None if nothing is similar enough
+        """
+        key = normalize(name)
+        if not key:
+            return None
+        query = trigrams(key)
+        shared: Dict[int, int] = {}
+        for gram in query:
+            for name_id in self._trigrams.get(gram, ()):
+                shared[name_id] = shared.get(name_id, 0) + 1
+
+        best, best_score = None, min_score
+        for name_id, count in shared.items():
+            score = 2 * count / (len(query) + self._name_sizes[name_id])
+            if score >= best_score and (best is None or score > best_score):
+                best, best_score = self._name_city[name_id], score
+        return self.cities[best] if best is not None else None
+
+    def lookup(self, name: str) -> Optional[City]:
+        """Exact lookup, falling back to fuzzy lookup."""
+        return self.get(name) or self.fuzzy(name)
+
+
+def load_cities(path: Optional[str] = None) -> CityIndex:
+    """
+    Load and index the city data file.
+
+    Args:
+        path: JSON file (defaults to CITY_DATA_PATH or cities.json)
+
+    Returns:
+        CityIndex over the file's cities
+    """
+    path = path or os.environ.get("CITY_DATA_PATH", DEFAULT_DATA_PATH)
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f)
+    return CityIndex([City(r["name"], r["info"], r.get("state", ""), r.get("aliases")) for r in records])
@@ -15,16 +15,21 @@ import sys
 import os
 import redis
 import smtplib
-import io
+import contextlib
 from typing import Optional, Dict, Any
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from minio import Minio
 from minio.error import S3Error
 from database_utils import (
     connect_to_db, close_connection,
     get_query_by_key, list_all_queries
 )
+from tracing import traced, start_span, inject_traceparent, TracedClient
+from profiling import PROFILING, PROFILE_MODES, profile_block
+from storage import get_client, ensure_bucket, upload_buffer, iter_object
+from redis_utils import get_client as get_redis_client, scan_keys
+from dedup_store import ContentStore
+from inventory import ObjectInventory
 
 
 def clear_terminal():
@@ -39,7 +44,10 @@ class FastAPIDriver:
         """Initialize the driver with base URL."""
         self.base_url = base_url.rstrip('/')
         self.db_connection = None
+        self.content_store = None
+        self.inventory = None
         
+    @traced()
     def check_server_status(self) -> bool:
         """Check if the FastAPI server is running."""
         try:
@@ -55,13 +63,17 @@ class FastAPIDriver:
         try:
             url = f"{self.base_url}{endpoint}"
             
-            if method.upper() == 'GET':
-                response = requests.get(url, params=params, headers=headers, cookies=cookies)
-            elif method.upper() == 'POST':
-                response = requests.post(url, json=json_data, params=params, headers=headers, cookies=cookies)
-            else:
-                print(f"ERROR: Unsupported HTTP method: {method}")
-                return None
+            with start_span(f"HTTP {method.upper()}", {"http.url": url}, kind="client") as span:
+                # Propagate the trace so the server's spans join this one
+                request_headers = inject_traceparent(headers)
+                if method.upper() == 'GET':
+                    response = requests.get(url, params=params, headers=request_headers, cookies=cookies)
+                elif method.upper() == 'POST':
+                    response = requests.post(url, json=json_data, params=params, headers=request_headers, cookies=cookies)
+                else:
+                    print(f"ERROR: Unsupported HTTP method: {method}")
+                    return None
+                span.set_attribute("http.status_code", response.status_code)
             
             print(f"REQUEST: {method.upper()} {url}")
             if params:
@@ -87,7 +99,14 @@ class FastAPIDriver:
             print(f"ERROR: Request failed: {e}")
             return None
 
+    def profiled(self, label: str):
+        """Profile the enclosed block if query profiling is turned on."""
+        if PROFILING.mode:
+            return profile_block(PROFILING.mode, label)
+        return contextlib.nullcontext()
+
     # Database methods
+    @traced()
     def execute_predefined_query(self, query_key: str):
         """Execute a predefined query by key."""
         clear_terminal()
@@ -112,7 +131,8 @@ class FastAPIDriver:
                 return
         
         from database_utils import execute_query_with_table_format, execute_query_with_headers
-        result = execute_query_with_table_format(self.db_connection, query_info['query'])
+        with self.profiled(f"query_{query_key}"):
+            result = execute_query_with_table_format(self.db_connection, query_info['query'])
         
         if result:
             print(result)
@@ -125,6 +145,7 @@ class FastAPIDriver:
         else:
             print("Failed to execute query.")
     
+    @traced()
     def execute_custom_query(self):
         """Execute a custom SQL query."""
         clear_terminal()
@@ -157,7 +178,8 @@ class FastAPIDriver:
         print("-" * 60)
         
         from database_utils import execute_query_with_table_format, execute_query_with_headers
-        result = execute_query_with_table_format(self.db_connection, sql_query)
+        with self.profiled("query_custom"):
+            result = execute_query_with_table_format(self.db_connection, sql_query)
         
         if result:
             print(result)
@@ -170,6 +192,7 @@ class FastAPIDriver:
         else:
             print("Failed to execute query.")
     
+    @traced()
     def test_root(self):
         """Test the root endpoint."""
         clear_terminal()
@@ -178,6 +201,7 @@ class FastAPIDriver:
         print("="*60)
         self.make_request('GET', '/')
     
+    @traced()
     def test_greet(self):
         """Test the greet endpoint with default and custom names."""
         clear_terminal()
@@ -196,6 +220,7 @@ class FastAPIDriver:
             name = "Aniket"
         self.make_request('GET', '/greet', params={'name': name})
     
+    @traced()
     def test_cube(self):
         """Test the cube calculation endpoint."""
         clear_terminal()
@@ -213,6 +238,7 @@ class FastAPIDriver:
             print("ERROR: Invalid number. Using default value 3.")
             self.make_request('GET', '/cube/3')
     
+    @traced()
     def test_add(self):
         """Test the addition endpoint."""
         clear_terminal()
@@ -236,6 +262,7 @@ class FastAPIDriver:
             print("ERROR: Invalid numbers. Using default values 5 and 7.")
             self.make_request('GET', '/add', params={'a': 5, 'b': 7})
     
+    @traced()
     def test_factorial(self):
         """Test the factorial calculation endpoint."""
         clear_terminal()
@@ -256,6 +283,7 @@ class FastAPIDriver:
             print("ERROR: Invalid number. Using default value 5.")
             self.make_request('GET', '/factorial/5')
     
+    @traced()
     def test_person(self):
         """Test the person info POST endpoint."""
         clear_terminal()
@@ -280,6 +308,7 @@ class FastAPIDriver:
             print("ERROR: Invalid age. Using default values.")
             self.make_request('POST', '/person', json_data={"name": "Alex", "age": 17})
     
+    @traced()
     def test_city_info(self):
         """Test the city info endpoint."""
         clear_terminal()
@@ -287,13 +316,15 @@ class FastAPIDriver:
         print("Testing City Information")
         print("="*60)
         
-        print("Available cities with info: Boston, NewYork, Seattle, Miami, Dallas")
+        print("Cities are matched ignoring case and spaces, and close misspellings are accepted.")
+        print("Examples: Boston, New York, Seattle, Miami, Dallas, San Francisco")
         city = input("Enter a city name (or press Enter for 'Boston'): ").strip()
         if not city:
             city = "Boston"
         
         self.make_request('GET', f'/city/{city}')
     
+    @traced()
     def test_rectangle_area(self):
         """Test the rectangle area calculation endpoint."""
         clear_terminal()
@@ -320,6 +351,7 @@ class FastAPIDriver:
             print("ERROR: Invalid dimensions. Using default values.")
             self.make_request('POST', '/area/rectangle', json_data={"width": 4.0, "height": 5.0})
     
+    @traced()
     def test_power(self):
         """Test the power calculation endpoint."""
         clear_terminal()
@@ -345,6 +377,7 @@ class FastAPIDriver:
             print("ERROR: Invalid numbers. Using default values.")
             self.make_request('GET', '/power/2')
     
+    @traced()
     def test_colors(self):
         """Test the colors list endpoint."""
         clear_terminal()
@@ -353,6 +386,7 @@ class FastAPIDriver:
         print("="*60)
         self.make_request('GET', '/colors')
     
+    @traced()
     def test_protected_data(self):
         """Test the protected data endpoint with header authentication."""
         clear_terminal()
@@ -361,7 +395,8 @@ class FastAPIDriver:
         print("="*60)
         
         print("This endpoint requires an API key in the header.")
-        print("Valid API key: mysecretkey")
+        default_key = os.environ.get("API_KEY", "mysecretkey")
+        print(f"Valid API key: {default_key} (the app's API_KEY)")
         
         # Test without API key first
         print("\nTesting without API key:")
@@ -369,13 +404,14 @@ class FastAPIDriver:
         
         # Test with API key
         print("\nTesting with API key:")
-        api_key = input("Enter API key (or press Enter for 'mysecretkey'): ").strip()
+        api_key = input(f"Enter API key (or press Enter for '{default_key}'): ").strip()
         if not api_key:
-            api_key = "mysecretkey"
+            api_key = default_key
         
         headers = {"api-key": api_key}
         self.make_request('GET', '/protected-data', headers=headers)
     
+    @traced()
     def test_cookie_greet(self):
         """Test the cookie-based personal greeting endpoint."""
         clear_terminal()
@@ -398,6 +434,7 @@ class FastAPIDriver:
         cookies = {"username": username}
         self.make_request('GET', '/cookie-greet', cookies=cookies)
     
+    @traced()
     def test_redis_service(self):
         """Test Redis shared memory functionality."""
         clear_terminal()
@@ -406,8 +443,8 @@ class FastAPIDriver:
         print("="*60)
         
         try:
-            # Connect to Redis
-            r = redis.Redis(host='localhost', port=6379, decode_responses=True)
+            # Connect to Redis through the shared connection pool
+            r = get_redis_client()
             
             # Test connection
             print("Testing Redis connection...")
@@ -423,21 +460,29 @@ class FastAPIDriver:
             if not value:
                 value = "test_value"
             
-            r.set(key, value)
+            # Store and read back the value in one round trip
+            pipe = r.pipeline(transaction=False)
+            pipe.set(key, value)
+            pipe.get(key)
+            _, retrieved = pipe.execute()
             print(f"SUCCESS: Stored: {key} = {value}")
-            
-            # Retrieve the value
-            retrieved = r.get(key)
             print(f"SUCCESS: Retrieved: {key} = {retrieved}")
             
-            # List all keys
-            keys = r.keys('*')
-            print(f"SUCCESS: All keys in Redis: {keys}")
+            # List keys with SCAN, which doesn't block Redis like KEYS * does
+            keys = []
+            for found in scan_keys(r):
+                keys.append(found)
+                if len(keys) == 50:
+                    break
+            more = " (first 50)" if len(keys) == 50 else ""
+            print(f"SUCCESS: Keys in Redis{more}: {keys}")
             
-            # Test with expiration
+            # Test with expiration, again in one round trip
             exp_key = "temp_key"
-            r.setex(exp_key, 30, "This expires in 30 seconds")
-            ttl = r.ttl(exp_key)
+            pipe = r.pipeline(transaction=False)
+            pipe.setex(exp_key, 30, "This expires in 30 seconds")
+            pipe.ttl(exp_key)
+            _, ttl = pipe.execute()
             print(f"SUCCESS: Set temporary key '{exp_key}' with TTL: {ttl} seconds")
             
         except redis.ConnectionError:
@@ -445,6 +490,24 @@ class FastAPIDriver:
         except Exception as e:
             print(f"ERROR: {e}")
     
+    def get_content_store(self, bucket_name: str) -> Optional[ContentStore]:
+        """Get the deduplicating store for a bucket, or None if Redis is not available."""
+        if self.content_store is None or self.content_store.bucket_name != bucket_name:
+            try:
+                r = get_redis_client(decode_responses=False)
+                r.ping()
+            except redis.RedisError:
+                return None
+            self.content_store = ContentStore(r, bucket_name)
+        return self.content_store
+    
+    def get_inventory(self, bucket_name: str) -> ObjectInventory:
+        """Get the local inventory index of a bucket."""
+        if self.inventory is None or self.inventory.bucket_name != bucket_name:
+            self.inventory = ObjectInventory(bucket_name)
+        return self.inventory
+    
+    @traced()
     def test_minio_service(self):
         """Test MinIO shared file system functionality."""
         clear_terminal()
@@ -453,20 +516,14 @@ class FastAPIDriver:
         print("="*60)
         
         try:
-            # Connect to MinIO
-            client = Minio(
-                "localhost:9000",
-                access_key="minioadmin",
-                secret_key="minioadmin123",
-                secure=False
-            )
+            # Shared client, created once per process
+            client = get_client()
             
             print("Testing MinIO connection...")
             
             # Create bucket if it doesn't exist
             bucket_name = "lab8-bucket"
-            if not client.bucket_exists(bucket_name):
-                client.make_bucket(bucket_name)
+            if ensure_bucket(bucket_name, client):
                 print(f"SUCCESS: Created bucket: {bucket_name}")
             else:
                 print(f"SUCCESS: Bucket already exists: {bucket_name}")
@@ -480,36 +537,55 @@ class FastAPIDriver:
             if not content:
                 content = "Hello from Lab 8!"
             
-            # Create a file-like object from string
-            data = io.BytesIO(content.encode('utf-8'))
-            
-            client.put_object(
-                bucket_name,
-                file_name,
-                data,
-                len(content.encode('utf-8')),
-                content_type='text/plain'
-            )
-            print(f"SUCCESS: Uploaded file: {file_name}")
-            
-            # List files in bucket
-            objects = client.list_objects(bucket_name)
-            print("SUCCESS: Files in bucket:")
-            for obj in objects:
-                print(f"  - {obj.object_name} (Size: {obj.size} bytes)")
-            
-            # Download and display file content
-            response = client.get_object(bucket_name, file_name)
-            downloaded_content = response.read().decode('utf-8')
-            print(f"SUCCESS: Downloaded content: {downloaded_content}")
-            response.close()
-            response.release_conn()
+            # Encoded once; the bytes are uploaded as they are, without a BytesIO copy
+            data = content.encode('utf-8')
+            
+            # Identical content is stored only once; without Redis for the
+            # name index, fall back to a plain upload
+            store = self.get_content_store(bucket_name)
+            if store is not None:
+                digest, uploaded = store.put_bytes(file_name, data, content_type='text/plain')
+                if uploaded:
+                    print(f"SUCCESS: Uploaded file: {file_name} (sha256 {digest[:12]}...)")
+                else:
+                    print(f"SUCCESS: Stored file: {file_name} (same content already in MinIO, upload skipped)")
+            else:
+                print("WARNING: Redis not available, uploading without deduplication")
+                upload_buffer(bucket_name, file_name, data, content_type='text/plain', client=client)
+                uploaded = True
+                print(f"SUCCESS: Uploaded file: {file_name}")
+            
+            # List files from the inventory index; the bucket is only listed
+            # again (in parallel) when the index is more than 5 minutes old
+            inventory = self.get_inventory(bucket_name)
+            if inventory.refresh_if_stale(max_age=300):
+                print("SUCCESS: Refreshed bucket inventory")
+            if uploaded:
+                inventory.record_put(store.blob_name(digest) if store is not None else file_name, len(data))
+            summary = inventory.summary()
+            print(f"SUCCESS: Files in bucket ({summary['objects']} objects, {summary['bytes']} bytes):")
+            for obj in inventory.list_objects(limit=20):
+                print(f"  - {obj['name']} (Size: {obj['size']} bytes)")
+            if summary['objects'] > 20:
+                print(f"  ... and {summary['objects'] - 20} more")
+            if store is not None:
+                stats = store.stats()
+                print(f"SUCCESS: Content store: {stats['names']} names, {stats['blobs']} blobs, "
+                      f"{stats['stored_bytes']} bytes stored for {stats['logical_bytes']} bytes of files")
+            
+            # Download and display file content, streamed in chunks
+            if store is not None:
+                downloaded = store.get_bytes(file_name)
+            else:
+                downloaded = b"".join(iter_object(bucket_name, file_name, client=client))
+            print(f"SUCCESS: Downloaded content: {downloaded.decode('utf-8')}")
             
         except S3Error as e:
             print(f"ERROR: MinIO Error: {e}")
         except Exception as e:
             print(f"ERROR: {e}")
     
+    @traced()
     def test_postfix_service(self):
         """Test Postfix email server functionality."""
         clear_terminal()
@@ -559,7 +635,8 @@ Lab 8 CLI Driver
             msg.attach(MIMEText(body, 'plain'))
             
             # Connect to SMTP server
-            server = smtplib.SMTP('localhost', 1587)
+            with start_span("smtp.connect", kind="client"):
+                server = TracedClient(smtplib.SMTP('localhost', 1587), "smtp")
             server.set_debuglevel(1)  # Enable debug output
             
             text = msg.as_string()
@@ -617,6 +694,7 @@ def print_menu():
     print("5.  Database Operations")
     print("6.  Run All Tests (Auto)")
     print("7.  Check All Services Status")
+    print(f"8.  Toggle Query Profiling       (currently: {PROFILING.mode or 'off'})")
     print("0.  Exit")
     print("="*60)
 
@@ -712,7 +790,7 @@ def main():
         print_menu()
         
         try:
-            choice = input("\nSelect an option (0-7): ").strip()
+            choice = input("\nSelect an option (0-8): ").strip()
             
             if choice == '0':
                 if driver.db_connection:
@@ -839,8 +917,7 @@ def main():
                 # Redis
                 print("2. Redis Cache Service...")
                 try:
-                    r = redis.Redis(host='localhost', port=6379, decode_responses=True)
-                    r.ping()
+                    get_redis_client().ping()
                     print("Redis is running!")
                 except:
                     print("Redis is not responding")
@@ -848,8 +925,7 @@ def main():
                 # MinIO
                 print("3. MinIO File Storage...")
                 try:
-                    client = Minio("localhost:9000", access_key="minioadmin", secret_key="minioadmin123", secure=False)
-                    client.list_buckets()
+                    get_client().list_buckets()
                     print("MinIO is running!")
                 except:
                     print("MinIO is not responding")
@@ -874,10 +950,20 @@ def main():
                         print("MySQL Database connection failed")
                 except:
                     print("MySQL Database is not responding")
+            elif choice == '8':
+                # Cycle query profiling: off -> sampling -> deterministic -> off
+                modes = [None] + list(PROFILE_MODES)
+                PROFILING.mode = modes[(modes.index(PROFILING.mode) + 1) % len(modes)]
+                clear_terminal()
+                print("="*60)
+                print(f"Query profiling is now: {PROFILING.mode or 'off'}")
+                if PROFILING.mode:
+                    print(f"Profiles of database queries will be written to '{PROFILING.output_dir}/'")
+                print("="*60)
             else:
                 clear_terminal()
                 print("="*60)
-                print("ERROR: Invalid choice. Please select 0-7.")
+                print("ERROR: Invalid choice. Please select 0-8.")
                 print("="*60)
             
             input("\nPress Enter to continue...")
@@ -0,0 +1,93 @@
+"""
+Request Coalescing for Lab 8
+============================
+
+This module provides single-flight deduplication for expensive, pure
+computations such as large factorials and powers.
+
+When several requests ask for the same value at the same time, only the
+first one (the leader) runs the computation. The others wait for the
+leader's result instead of starting their own copy. Once the computation
+finishes, the key is forgotten, so this is not a cache: a later request
+for the same value computes it again (HTTP caching covers repeat requests
+from the same client).
+
+The computation runs in the threadpool so the event loop stays free to
+accept the identical requests that will join it. If the computation
+raises, every waiting request gets the same exception.
+
+Coalescing is recorded in the metrics registry:
+
+- singleflight_calls_total   counter  group, role ("leader" or "coalesced")
+- singleflight_in_flight     gauge    group
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import REGISTRY, Counter, Gauge
+
+CALLS_TOTAL = REGISTRY.register(Counter(
+    "singleflight_calls_total", "Coalesced computations by role (leader ran it, coalesced waited).",
+    ("group", "role")))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "singleflight_in_flight", "Distinct computations currently running.", ("group",)))
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time and shares its result."""
+
+    def __init__(self, group: str):
+        """
+        Args:
+            group: Name used as the metrics label, e.g. "factorial"
+        """
+        self.group = group
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run func(*args) in the threadpool, or join the run already in flight for key.
+
+        Args:
+            key: Identifies the computation; equal keys must give equal results
+            func: Synchronous function to run
+            *args: Arguments for func
+
+        Returns:
+            The result of func(*args)
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, func, args))
+            self._calls[key] = task
+            CALLS_TOTAL.inc((self.group, "leader"))
+        else:
+            CALLS_TOTAL.inc((self.group, "coalesced"))
+        # The run is a task of its own and shield() keeps a disconnecting
+        # client (even the leader) from cancelling it for everyone else
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, func: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        IN_FLIGHT.inc((self.group,))
+        try:
+            return await run_in_threadpool(func, *args)
+        finally:
+            del self._calls[key]
+            IN_FLIGHT.dec((self.group,))
+
+    def stats(self) -> Tuple[float, float]:
+        """
+        Get the number of leader and coalesced calls so far.
+
+        Returns:
+            Tuple of (leader calls, coalesced calls)
+        """
+        return (CALLS_TOTAL.value((self.group, "leader")),
+                CALLS_TOTAL.value((self.group, "coalesced")))
@@ -0,0 +1,228 @@
+"""
+Response Compression Middleware for Lab 8
+=========================================
+
+This module provides an ASGI middleware that compresses response bodies
+with brotli or gzip, depending on the client's Accept-Encoding header.
+
+- Complete responses smaller than `minimum_size` bytes are sent as-is,
+  since compressing a tiny body costs CPU and saves almost nothing.
+- Streaming responses (e.g. /reports/{key}?format=ndjson) are compressed
+  chunk by chunk and flushed after every chunk, so rows still reach the
+  client as they are produced.
+- Brotli is only offered when the `brotli` package is installed.
+"""
+
+import gzip
+import io
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_EXCLUDED_MEDIA_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into a mapping of coding -> q-value.
+
+    Args:
+        header: Raw header value, e.g. "gzip;q=0.8, br"
+
+    Returns:
+        Dictionary of lower-cased content codings and their weights
+    """
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def choose_encoding(header: str, brotli_enabled: bool = True) -> Optional[str]:
+    """
+    Pick the best supported content coding for a request.
+
+    Args:
+        header: Raw Accept-Encoding header value
+        brotli_enabled: Whether "br" may be chosen
+
+    Returns:
+        "br", "gzip" or None if the response should not be compressed
+    """
+    weights = parse_accept_encoding(header)
+    wildcard = weights.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli_enabled and brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _GzipStream:
+    """Incremental gzip compressor with a flush after each chunk."""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    """Incremental brotli compressor with a flush after each chunk."""
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """
+    Compress a complete response body in one call.
+
+    Args:
+        body: Uncompressed bytes
+        encoding: "br" or "gzip"
+        gzip_level: zlib compression level (1-9)
+        brotli_quality: brotli quality (0-11)
+
+    Returns:
+        Compressed bytes
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    buffer = io.BytesIO()
+    # mtime=0 keeps the output deterministic for identical bodies
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=gzip_level, mtime=0) as f:
+        f.write(body)
+    return buffer.getvalue()
+
+
+class CompressionMiddleware:
+    """ASGI middleware that gzip/brotli-compresses responses above a size threshold."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4, brotli_enabled: bool = True,
+                 excluded_media_types: Tuple[str, ...] = DEFAULT_EXCLUDED_MEDIA_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli_enabled = brotli_enabled
+        self.excluded_media_types = excluded_media_types
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept, self.brotli_enabled)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingResponder:
+    """Wraps `send` for one request and rewrites the response messages."""
+
+    def __init__(self, config: CompressionMiddleware, encoding: str, send):
+        self.config = config
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.passthrough = False
+        self.stream = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the start message until we know whether to compress
+            self.start_message = message
+            headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+            media_type = headers.get(b"content-type", b"").decode("latin-1")
+            if (b"content-encoding" in headers
+                    or media_type.startswith(self.config.excluded_media_types)):
+                self.passthrough = True
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is None and not more_body:
+            # Whole body in one message: compress only if it is worth it
+            if len(body) < self.config.minimum_size:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            compressed = compress_body(body, self.encoding, self.config.gzip_level,
+                                       self.config.brotli_quality)
+            await self.send(self._compressed_start(len(compressed)))
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        if self.stream is None:
+            # First chunk of a streaming response; length is unknown
+            if self.encoding == "br":
+                self.stream = _BrotliStream(self.config.brotli_quality)
+            else:
+                self.stream = _GzipStream(self.config.gzip_level)
+            await self.send(self._compressed_start(None))
+
+        chunk = self.stream.compress(body) if body else b""
+        if not more_body:
+            chunk += self.stream.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compressed_start(self, length: Optional[int]):
+        message = self.start_message
+        self.start_message = None
+        headers: List[Tuple[bytes, bytes]] = [
+            (k, v) for k, v in message.get("headers", [])
+            if k.lower() not in (b"content-length", b"vary")
+        ]
+        vary = [v for k, v in message.get("headers", []) if k.lower() == b"vary"]
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**message, "headers": headers}
@@ -6,10 +6,16 @@ This module provides database connectivity and query execution functions
 for the MySQL database used in Lab 7.
 """
 
+import csv
+import io
 import mysql.connector
-from typing import List, Tuple, Dict, Any, Optional
+from decimal import Decimal
+from typing import List, Tuple, Dict, Any, Optional, Iterator
+from tracing import traced, current_span, start_span
+from serialization import get_dumps
 
 
+@traced("mysql.ensure_database_exists", kind="client")
 def ensure_database_exists(host: str = "localhost", port: int = 3307, 
                            user: str = "root", password: str = "secret_password", 
                            database_file: str = "createguitar.sql") -> None:
@@ -50,6 +56,7 @@ def ensure_database_exists(host: str = "localhost", port: int = 3307,
         raise
 
 
+@traced("mysql.connect", kind="client")
 def connect_to_db(host: str = "localhost", port: int = 3307, 
                   user: str = "root", password: str = "secret_password",
                   database: str = "my_guitar_shop",
@@ -75,6 +82,7 @@ def connect_to_db(host: str = "localhost", port: int = 3307,
         return None
 
 
+@traced("mysql.query", kind="client")
 def execute_query_with_headers(mydb: mysql.connector.MySQLConnection, sql_query: str) -> Optional[Dict[str, Any]]:
     """
     Execute a SQL query and return results with column headers.
@@ -98,6 +106,8 @@ def execute_query_with_headers(mydb: mysql.connector.MySQLConnection, sql_query:
         mycursor = mydb.cursor()
 
         # Execute the query
+        span = current_span()
+        span.set_attribute("db.statement", sql_query)
         mycursor.execute(sql_query)
 
         # Get column headers
@@ -105,6 +115,7 @@ def execute_query_with_headers(mydb: mysql.connector.MySQLConnection, sql_query:
 
         # Fetch all the results
         data = mycursor.fetchall()
+        span.set_attribute("db.rows", len(data))
         
         return {
             'headers': headers,
@@ -116,6 +127,7 @@ def execute_query_with_headers(mydb: mysql.connector.MySQLConnection, sql_query:
         return None
 
 
+@traced("format_query_results_as_table")
 def format_query_results_as_table(headers: List[str], data: List[Tuple]) -> str:
     """
     Format query results as a nicely formatted table.
@@ -184,6 +196,122 @@ def execute_query_with_table_format(mydb: mysql.connector.MySQLConnection, sql_q
     return None
 
 
+@traced("mysql.query_stream", kind="client")
+def open_query_stream(mydb: mysql.connector.MySQLConnection, sql_query: str,
+                      batch_size: int = 500) -> Optional[Tuple[List[str], Iterator[Tuple]]]:
+    """
+    Execute a SQL query and return its headers plus a lazy row iterator.
+
+    Unlike execute_query_with_headers, rows are not fetched up front. The
+    cursor is unbuffered and rows are pulled from the server in batches of
+    `batch_size` only as the iterator is consumed, so memory use depends on
+    the batch size rather than the size of the result set. The query is
+    executed before returning so that errors surface to the caller early.
+
+    Args:
+        mydb: MySQL connection object
+        sql_query: SQL query to execute
+        batch_size: Number of rows fetched from the server per round trip
+
+    Returns:
+        Tuple of (headers, row iterator), or None if query fails
+    """
+    if mydb is None:
+        return None
+    try:
+        # Reconnect in place, so the caller keeps closing the connection in use
+        if not mydb.is_connected():
+            print("Reconnection to db required")
+            mydb.reconnect(attempts=1)
+
+        mycursor = mydb.cursor(buffered=False)
+        current_span().set_attribute("db.statement", sql_query)
+        mycursor.execute(sql_query)
+        headers = [desc[0] for desc in mycursor.description]
+    except mysql.connector.Error as err:
+        print(f"Error executing query: {err}")
+        return None
+
+    def rows() -> Iterator[Tuple]:
+        try:
+            while True:
+                with start_span("mysql.fetchmany", {"db.batch_size": batch_size}, kind="client") as span:
+                    batch = mycursor.fetchmany(batch_size)
+                    span.set_attribute("db.rows", len(batch))
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            try:
+                mycursor.close()
+            except mysql.connector.Error:
+                # Abandoned streams leave unread rows; closing the
+                # connection afterwards discards them.
+                pass
+
+    return headers, rows()
+
+
+def _json_cell(value: Any) -> Any:
+    """Convert a MySQL cell value into something every JSON encoder can encode."""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, Decimal):
+        # Same rule as FastAPI's jsonable_encoder for the plain JSON responses
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def iter_rows_as_ndjson(headers: List[str], rows: Iterator[Tuple]) -> Iterator[str]:
+    """
+    Serialize rows as newline-delimited JSON, one object per row.
+
+    Args:
+        headers: List of column headers
+        rows: Iterable of data rows
+
+    Returns:
+        Iterator of NDJSON lines (each ending in a newline)
+    """
+    # The app's configured encoder (msgspec, orjson or stdlib)
+    dumps = get_dumps()
+    for row in rows:
+        record = {header: _json_cell(cell) for header, cell in zip(headers, row)}
+        yield dumps(record).decode("utf-8") + "\n"
+
+
+def iter_rows_as_csv(headers: List[str], rows: Iterator[Tuple],
+                     rows_per_chunk: int = 100) -> Iterator[str]:
+    """
+    Serialize rows as CSV, starting with a header line.
+
+    Args:
+        headers: List of column headers
+        rows: Iterable of data rows
+        rows_per_chunk: Number of rows written into each yielded chunk
+
+    Returns:
+        Iterator of CSV text chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    pending = 1
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+@traced("mysql.close", kind="client")
 def close_connection(mydb: mysql.connector.MySQLConnection) -> None:
     """
     Close the MySQL database connection.
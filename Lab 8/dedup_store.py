@@ -0,0 +1,256 @@
+"""
+Content-Addressed Object Store for Lab 8
+========================================
+
+This module stores named files in MinIO without storing the same content
+twice:
+
+- Each file is hashed with SHA-256 and its content is stored once, as a
+  blob named "<blob prefix><digest>" (e.g. "blobs/sha256/9f86d0...").
+- A Redis hash maps every file name to its digest, and another counts
+  how many names refer to each digest. Both are updated together by a
+  Lua script, so concurrent writers never leave the counts wrong.
+- A third hash records the size of every blob known to be uploaded.
+  Before uploading, the store checks it: content that is already stored
+  costs one Redis round trip instead of an upload.
+- Deleting a name only unlinks it. Blobs nobody refers to any more are
+  removed by collect_garbage(). It skips recently modified blobs, which
+  a writer may have just uploaded and not linked yet. It should run while
+  the store is quiet: a writer reusing an old blob at the same moment
+  could otherwise lose it.
+
+Large files are hashed and uploaded through mmap (storage.iter_mapped()
+and storage.upload_mapped()), so they are never held in memory.
+"""
+
+import hashlib
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from minio.error import S3Error
+
+from storage import (CHUNK_SIZE, download_file, ensure_bucket, get_client, iter_mapped, read_object, upload_buffer,
+                     upload_mapped)
+
+# KEYS[1] = names hash, KEYS[2] = refs hash; ARGV = name, digest.
+# Points the name at the digest and moves one reference; returns the old digest.
+LINK_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old == ARGV[2] then
+  return old
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+if old and redis.call('HINCRBY', KEYS[2], old, -1) <= 0 then
+  redis.call('HDEL', KEYS[2], old)
+end
+return old
+"""
+
+# KEYS[1] = names hash, KEYS[2] = refs hash; ARGV = name.
+# Removes the name and its reference; returns its digest.
+UNLINK_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if not old then
+  return false
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+if redis.call('HINCRBY', KEYS[2], old, -1) <= 0 then
+  redis.call('HDEL', KEYS[2], old)
+end
+return old
+"""
+
+
+def _text(value) -> Optional[str]:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def file_digest(path: str, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int]:
+    """
+    Hash a file without reading it into memory.
+
+    Args:
+        path: File to hash
+        chunk_size: Bytes read at a time
+
+    Returns:
+        Tuple of (SHA-256 hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # Hashed straight from the mapped pages, without copying them
+    for chunk in iter_mapped(path, chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class ContentStore:
+    """Named files in MinIO, each distinct content stored once."""
+
+    def __init__(self, redis_client: redis.Redis, bucket_name: str = "lab8-bucket",
+                 blob_prefix: str = "blobs/sha256/", index_prefix: str = "cas:", client=None):
+        """
+        Args:
+            redis_client: Redis client holding the index
+            bucket_name: MinIO bucket for the blobs
+            blob_prefix: Object name prefix for blobs
+            index_prefix: Prefix of the Redis index keys
+            client: Minio client (defaults to the shared one)
+        """
+        self.redis = redis_client
+        self.bucket_name = bucket_name
+        self.blob_prefix = blob_prefix
+        self.client = client or get_client()
+        self.names_key = f"{index_prefix}names"
+        self.refs_key = f"{index_prefix}refs"
+        self.blobs_key = f"{index_prefix}blobs"
+        self._link = redis_client.register_script(LINK_SCRIPT)
+        self._unlink = redis_client.register_script(UNLINK_SCRIPT)
+        self._bucket_ready = False
+
+    def blob_name(self, digest: str) -> str:
+        return f"{self.blob_prefix}{digest}"
+
+    def _ensure_bucket(self) -> None:
+        if not self._bucket_ready:
+            ensure_bucket(self.bucket_name, self.client)
+            self._bucket_ready = True
+
+    def _link_name(self, name: str, digest: str) -> None:
+        # Only linked once the blob is stored, so a name never points at
+        # content that failed to upload
+        self._link(keys=[self.names_key, self.refs_key], args=[name, digest])
+
+    def put_bytes(self, name: str, data: bytes, content_type: str = "application/octet-stream") -> Tuple[str, bool]:
+        """
+        Store content under a name.
+
+        Args:
+            name: File name, e.g. "reports/simple_1.csv"
+            data: Content
+            content_type: Content type used if the blob is uploaded
+
+        Returns:
+            Tuple of (digest, True if the content was uploaded or False
+            if it was already stored)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        uploaded = not self.redis.hexists(self.blobs_key, digest)
+        if uploaded:
+            self._ensure_bucket()
+            upload_buffer(self.bucket_name, self.blob_name(digest), data, content_type=content_type,
+                          client=self.client)
+            self.redis.hset(self.blobs_key, digest, len(data))
+        self._link_name(name, digest)
+        return digest, uploaded
+
+    def put_file(self, name: str, path: str, content_type: str = "application/octet-stream") -> Tuple[str, bool]:
+        """
+        Store a file from disk under a name.
+
+        The file is read once to hash it, and a second time only if its
+        content isn't stored yet.
+
+        Args:
+            name: File name in the store
+            path: File to store
+            content_type: Content type used if the blob is uploaded
+
+        Returns:
+            Tuple of (digest, True if the content was uploaded)
+        """
+        digest, size = file_digest(path)
+        uploaded = not self.redis.hexists(self.blobs_key, digest)
+        if uploaded:
+            self._ensure_bucket()
+            upload_mapped(self.bucket_name, self.blob_name(digest), path, content_type=content_type,
+                          client=self.client)
+            self.redis.hset(self.blobs_key, digest, size)
+        self._link_name(name, digest)
+        return digest, uploaded
+
+    def digest(self, name: str) -> Optional[str]:
+        """Get the digest stored under a name, or None."""
+        return _text(self.redis.hget(self.names_key, name))
+
+    def get_bytes(self, name: str) -> Optional[bytes]:
+        """Read the content stored under a name, or None if there is none."""
+        digest = self.digest(name)
+        if digest is None:
+            return None
+        return read_object(self.bucket_name, self.blob_name(digest), client=self.client)
+
+    def download(self, name: str, path: str) -> Optional[int]:
+        """
+        Write the content stored under a name to a file.
+
+        Returns:
+            Number of bytes written, or None if the name is unknown
+        """
+        digest = self.digest(name)
+        if digest is None:
+            return None
+        return download_file(self.bucket_name, self.blob_name(digest), path, client=self.client)
+
+    def delete(self, name: str) -> bool:
+        """
+        Remove a name. Its blob stays until collect_garbage() runs.
+
+        Returns:
+            True if the name existed
+        """
+        return self._unlink(keys=[self.names_key, self.refs_key], args=[name]) is not None
+
+    def list_names(self) -> Dict[str, str]:
+        """Get every name and its digest."""
+        return {_text(name): _text(digest) for name, digest in self.redis.hgetall(self.names_key).items()}
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Summarize the store.
+
+        Returns:
+            Dictionary with the number of names and blobs, the bytes
+            actually stored, and the bytes the names would take without
+            deduplication
+        """
+        sizes = {_text(d): int(s) for d, s in self.redis.hgetall(self.blobs_key).items()}
+        refs = {_text(d): int(c) for d, c in self.redis.hgetall(self.refs_key).items()}
+        return {
+            "names": self.redis.hlen(self.names_key),
+            "blobs": len(sizes),
+            "stored_bytes": sum(sizes.values()),
+            "logical_bytes": sum(sizes.get(digest, 0) * count for digest, count in refs.items()),
+        }
+
+    def collect_garbage(self, grace_seconds: float = 3600.0) -> List[str]:
+        """
+        Delete blobs that no name refers to.
+
+        Args:
+            grace_seconds: Blobs modified more recently than this are kept,
+                in case a writer has just uploaded them and not linked them yet
+
+        Returns:
+            Digests of the deleted blobs
+        """
+        cutoff = time.time() - grace_seconds
+        deleted = []
+        for obj in self.client.list_objects(self.bucket_name, prefix=self.blob_prefix):
+            digest = obj.object_name[len(self.blob_prefix):]
+            if self.redis.hexists(self.refs_key, digest):
+                continue
+            if obj.last_modified is not None and obj.last_modified.timestamp() > cutoff:
+                continue
+            # Forget the blob first, so new writers upload it again
+            self.redis.hdel(self.blobs_key, digest)
+            try:
+                self.client.remove_object(self.bucket_name, obj.object_name)
+            except S3Error as e:
+                print(f"Content store: could not delete blob {digest}: {e}")
+                continue
+            deleted.append(digest)
+        return deleted
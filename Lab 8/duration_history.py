@@ -0,0 +1,119 @@
+"""
+Test Duration History for Lab 8
+===============================
+
+This module keeps the durations of past test runs in a JSON file, so
+test.py can report the slowest tests and flag tests that got slower.
+
+- Every run adds one duration per test and per test class. Only the last
+  `keep` runs are kept.
+- A test's baseline is the median of its previous runs, so one slow run
+  doesn't move it much.
+- A test has regressed when it is at least `factor` times slower than
+  its baseline and also at least `min_seconds` slower, so very fast tests
+  don't get flagged for tiny jitter.
+- Histories are kept per mode (e.g. "docker-j8" or "hermetic-j1"),
+  because the same test takes very different times against containers
+  and in-process, and with more or fewer workers sharing the machine.
+"""
+
+import json
+import os
+import statistics
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_HISTORY_FILE = ".test_durations.json"
+
+
+class DurationHistory:
+    """Per-test and per-class durations of recent runs."""
+
+    def __init__(self, path: str = DEFAULT_HISTORY_FILE, mode: str = "docker", keep: int = 10):
+        """
+        Args:
+            path: JSON file holding the history
+            mode: History to use, e.g. "docker-j8" or "hermetic-j1"
+            keep: Runs kept per test
+        """
+        self.path = path
+        self.mode = mode
+        self.keep = keep
+        self._data: Dict[str, Dict[str, Dict[str, List[float]]]] = {}
+
+    def load(self) -> "DurationHistory":
+        """Read the history file; a missing or unreadable file means no history."""
+        try:
+            with open(self.path, "r") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError) as err:
+            if os.path.exists(self.path):
+                print(f"Ignoring unreadable duration history {self.path}: {err}")
+            self._data = {}
+        return self
+
+    def _runs(self, kind: str) -> Dict[str, List[float]]:
+        return self._data.setdefault(self.mode, {}).setdefault(kind, {})
+
+    def baseline(self, name: str, kind: str = "tests") -> Optional[float]:
+        """
+        Get the baseline duration of a test or class.
+
+        Args:
+            name: Test id (e.g. "FastAPILab1Test.test_1_root") or class name
+            kind: "tests" or "classes"
+
+        Returns:
+            Median of the recorded runs, or None if there are none
+        """
+        runs = self._runs(kind).get(name)
+        return statistics.median(runs) if runs else None
+
+    def regressions(self, durations: Dict[str, float], kind: str = "tests", factor: float = 1.5,
+                    min_seconds: float = 0.05) -> List[Tuple[str, float, float]]:
+        """
+        Compare this run's durations with the baselines.
+
+        Call before record(), so this run isn't part of its own baseline.
+
+        Args:
+            durations: Name -> seconds for this run
+            kind: "tests" or "classes"
+            factor: How many times slower than the baseline counts as a regression
+            min_seconds: Minimum slowdown, in seconds, that counts
+
+        Returns:
+            List of (name, seconds, baseline seconds), biggest slowdown first
+        """
+        slower = []
+        for name, seconds in durations.items():
+            base = self.baseline(name, kind)
+            if base is not None and seconds >= base * factor and seconds - base >= min_seconds:
+                slower.append((name, seconds, base))
+        return sorted(slower, key=lambda item: item[1] - item[2], reverse=True)
+
+    def record(self, durations: Dict[str, float], kind: str = "tests") -> None:
+        """Add this run's durations, keeping only the last `keep` runs per name."""
+        runs = self._runs(kind)
+        for name, seconds in durations.items():
+            runs[name] = (runs.get(name, []) + [round(seconds, 4)])[-self.keep:]
+
+    def save(self) -> None:
+        """Write the history file atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def slowest(durations: Dict[str, float], count: int) -> List[Tuple[str, float]]:
+    """
+    Get the slowest entries.
+
+    Args:
+        durations: Name -> seconds
+        count: Number of entries to return
+
+    Returns:
+        List of (name, seconds), slowest first
+    """
+    return sorted(durations.items(), key=lambda item: item[1], reverse=True)[:count]
@@ -0,0 +1,403 @@
+"""
+Hermetic Test Stand-ins for Lab 8
+=================================
+
+This module lets test.py run without the Docker compose stack
+(python test.py --hermetic). Every external service is replaced by a
+local stand-in that speaks the same protocol, so the tests and the app
+use their usual clients:
+
+- MySQL: a SQLite copy of createguitar.sql. use_sqlite_for_mysql()
+  patches mysql.connector in the test process, so connect_to_db() in
+  database_utils.py returns it. The connection mimics the parts of
+  mysql.connector the lab uses, including Decimal and datetime columns.
+- Redis: a fakeredis server on a local port, with Lua support for the
+  rate limiter script and pub/sub for API key revocations.
+- MinIO: a moto S3 server on a local port.
+- Postfix: an aiosmtpd server that keeps every message in memory.
+- The FastAPI app is called in-process through Starlette's TestClient.
+  InProcessClient wraps it in the requests API, so the FastAPI tests are
+  the same code whether they run against a container or in-process.
+
+The services run in the main test process and are shared by the worker
+processes through environment variables, just like the real stack.
+"""
+
+import io
+import logging
+import os
+import re
+import socket
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from decimal import Decimal
+from functools import partialmethod
+from http.client import HTTPMessage
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import mysql.connector
+import redis
+import requests
+
+# MySQL-only statements that have no SQLite equivalent and are skipped
+_SKIPPED_STATEMENTS = re.compile(r"^\s*(CREATE\s+DATABASE|USE|CREATE\s+USER|GRANT|DROP\s+USER)\b", re.IGNORECASE)
+_MYSQL_ESCAPES = {"r": "\r", "n": "\n", "t": "\t", "0": "\0", "\\": "\\", "'": "''", '"': '"'}
+
+# Typed like mysql.connector: DECIMAL columns as Decimal, DATETIME as datetime
+sqlite3.register_converter("DECIMAL", lambda raw: Decimal(raw.decode("ascii")))
+sqlite3.register_converter("DATETIME", lambda raw: datetime.strptime(raw.decode("ascii"), "%Y-%m-%d %H:%M:%S"))
+
+
+def _keep_open_on_error_replies(handler_class):
+    """
+    Make the fakeredis TCP handler keep a connection open after an error
+    reply, as Redis does.
+
+    Its handler closes the connection after any error reply, so redis-py's
+    SCRIPT LOAD after a NOSCRIPT reply to EVALSHA fails with "Connection
+    closed by server".
+    """
+    class Handler(handler_class):
+        def setup(self) -> None:
+            super().setup()
+            read_response = self.current_client.read_response
+
+            def read_reply(**kwargs):
+                try:
+                    return read_response(**kwargs)
+                except redis.ResponseError as error:
+                    return error
+
+            self.current_client.read_response = read_reply
+
+    return Handler
+
+
+def free_port() -> int:
+    """Ask the OS for a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def mysql_script_to_sqlite(sql_script: str) -> List[str]:
+    """
+    Translate a MySQL setup script into SQLite statements.
+
+    Args:
+        sql_script: Contents of e.g. createguitar.sql
+
+    Returns:
+        Statements to execute in order
+    """
+    # Drop comments first; statements are then split on ";" the same way
+    # ensure_database_exists() does for MySQL
+    sql_script = re.sub(r"/\*.*?\*/", "", sql_script, flags=re.DOTALL)
+    sql_script = re.sub(r"^\s*--.*$", "", sql_script, flags=re.MULTILINE)
+    statements = []
+    for command in (cmd.strip() for cmd in sql_script.split(";")):
+        if not command or _SKIPPED_STATEMENTS.match(command):
+            continue
+        command = re.sub(r"\bAUTO_INCREMENT\b", "", command, flags=re.IGNORECASE)
+        command = re.sub(r"\\(.)", lambda m: _MYSQL_ESCAPES.get(m.group(1), m.group(1)), command)
+        statements.append(command)
+    return statements
+
+
+def build_sqlite_database(path: str, database_file: str = "createguitar.sql") -> None:
+    """
+    Create a SQLite database from the MySQL setup script.
+
+    Args:
+        path: SQLite file to create (replaced if it exists)
+        database_file: MySQL script with the schema and data
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    with open(database_file, "r") as f:
+        statements = mysql_script_to_sqlite(f.read())
+    conn = sqlite3.connect(path)
+    try:
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class SQLiteCursor:
+    """Cursor with the mysql.connector methods the lab uses."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql_query: str, params=()) -> None:
+        try:
+            self._cursor.execute(sql_query, params)
+        except sqlite3.Error as err:
+            # Callers only catch mysql.connector.Error
+            raise mysql.connector.DatabaseError(msg=str(err))
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Connection with the mysql.connector methods the lab uses."""
+
+    def __init__(self, path: str):
+        # Report streams are read from a threadpool thread
+        self._conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False, isolation_level=None)
+        self._path = path
+        self._open = True
+
+    def cursor(self, buffered: bool = True) -> SQLiteCursor:
+        return SQLiteCursor(self._conn.cursor())
+
+    def is_connected(self) -> bool:
+        return self._open
+
+    def reconnect(self, attempts: int = 1) -> None:
+        self.__init__(self._path)
+
+    def close(self) -> None:
+        self._conn.close()
+        self._open = False
+
+
+def connect_to_sqlite(path: str, database_file: str = "createguitar.sql") -> SQLiteConnection:
+    """
+    Open the SQLite stand-in, creating it on first use.
+
+    Args:
+        path: SQLite file
+        database_file: MySQL script used if the file doesn't exist yet
+
+    Returns:
+        SQLiteConnection
+    """
+    if not os.path.exists(path):
+        build_sqlite_database(path, database_file)
+    return SQLiteConnection(path)
+
+
+def use_sqlite_for_mysql(path: str, database_file: str = "createguitar.sql") -> None:
+    """
+    Make every MySQL connection in this process open the SQLite stand-in.
+
+    Patches mysql.connector.connect and skips database_utils'
+    ensure_database_exists(), whose SHOW DATABASES has no SQLite
+    equivalent. The app's own code is left unchanged.
+
+    Args:
+        path: SQLite file
+        database_file: MySQL script used if the file doesn't exist yet
+    """
+    import database_utils
+
+    mysql.connector.connect = lambda **kwargs: connect_to_sqlite(path, database_file)
+    database_utils.ensure_database_exists = lambda *args, **kwargs: None
+
+
+class _RawBody(io.BytesIO):
+    """Response body, plus the headers requests reads cookies from."""
+
+    def __init__(self, content: bytes, message: HTTPMessage):
+        super().__init__(content)
+        self._original_response = SimpleNamespace(msg=message)
+
+
+class _ASGIAdapter(requests.adapters.BaseAdapter):
+    """Transport adapter that sends requests through a Starlette TestClient."""
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        upstream = self.client.request(request.method, request.url, headers=dict(request.headers),
+                                       content=request.body)
+        message = HTTPMessage()
+        for name, value in upstream.headers.multi_items():
+            message[name] = value
+        response = requests.Response()
+        response.status_code = upstream.status_code
+        response.headers = requests.structures.CaseInsensitiveDict(upstream.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        # The TestClient has already decoded the body; the response still
+        # reports the original Content-Encoding
+        response.raw = _RawBody(upstream.content, message)
+        response.reason = upstream.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        requests.cookies.extract_cookies_to_jar(response.cookies, request, response.raw)
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class _WebSocket:
+    """Gives a TestClient WebSocket the send()/recv() API of websockets.sync."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._session.__exit__(*exc_info)
+
+    def send(self, message) -> None:
+        if isinstance(message, bytes):
+            self._session.send_bytes(message)
+        else:
+            self._session.send_text(message)
+
+    def recv(self):
+        return self._session.receive_text()
+
+
+class InProcessClient:
+    """
+    The requests API (get, post, delete, Session) for an ASGI app in this process.
+
+    Every call is independent, as with requests.get(); cookies are only
+    kept by a Session(). The app's lifespan runs once, when the client
+    is created, and all requests share one event loop, as under uvicorn.
+    """
+
+    def __init__(self, app, base_url: str = "http://testserver"):
+        from starlette.testclient import TestClient
+
+        self.base_url = base_url
+        self._client = TestClient(app, base_url=base_url, follow_redirects=False)
+        # Cookies belong to the requests.Session, never to the shared TestClient
+        self._client.cookies.jar = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        self._client.__enter__()
+        self._adapter = _ASGIAdapter(self._client)
+
+    def Session(self) -> requests.Session:
+        session = requests.Session()
+        session.mount("http://", self._adapter)
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        with self.Session() as session:
+            return session.request(method, url, **kwargs)
+
+    get = partialmethod(request, "GET")
+    post = partialmethod(request, "POST")
+    put = partialmethod(request, "PUT")
+    delete = partialmethod(request, "DELETE")
+
+    def websocket_connect(self, url: str) -> _WebSocket:
+        return _WebSocket(self._client.websocket_connect(url))
+
+    def close(self) -> None:
+        self._client.__exit__(None, None, None)
+
+
+class _SMTPCollector:
+    """aiosmtpd handler that keeps every accepted message."""
+
+    def __init__(self):
+        self.messages: List[SimpleNamespace] = []
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.messages.append(SimpleNamespace(
+                mail_from=envelope.mail_from, rcpt_tos=list(envelope.rcpt_tos), content=envelope.content))
+        return "250 Message accepted for delivery"
+
+
+class HermeticServices:
+    """Starts and stops the local stand-ins for MySQL, Redis, MinIO and Postfix."""
+
+    def __init__(self, database_file: str = "createguitar.sql"):
+        self.database_file = database_file
+        self.environ: Dict[str, str] = {}
+        self.smtp_messages: Optional[List[SimpleNamespace]] = None
+        self._workdir = None
+        self._redis = None
+        self._s3 = None
+        self._smtp = None
+
+    def start(self) -> Dict[str, str]:
+        """
+        Start every stand-in.
+
+        Returns:
+            Environment variables pointing the app and the tests at them
+        """
+        from aiosmtpd.controller import Controller
+        from fakeredis import TcpFakeServer
+        from moto.server import ThreadedMotoServer
+
+        self._workdir = tempfile.TemporaryDirectory(prefix="lab8-hermetic-")
+        sqlite_path = os.path.join(self._workdir.name, "my_guitar_shop.sqlite3")
+        build_sqlite_database(sqlite_path, self.database_file)
+
+        self._redis = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        self._redis.RequestHandlerClass = _keep_open_on_error_replies(self._redis.RequestHandlerClass)
+        threading.Thread(target=self._redis.serve_forever, name="fake-redis", daemon=True).start()
+        redis_port = self._redis.server_address[1]
+
+        # Keep the S3 server's request log out of the test output
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        s3_port = free_port()
+        self._s3 = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port, verbose=False)
+        self._s3.start()
+
+        handler = _SMTPCollector()
+        self._smtp = Controller(handler, hostname="127.0.0.1", port=free_port())
+        self._smtp.start()
+        self.smtp_messages = handler.messages
+
+        self.environ = {
+            "LAB8_HERMETIC": "1",
+            "SQLITE_DB_PATH": sqlite_path,
+            "REDIS_HOST": "127.0.0.1",
+            "REDIS_PORT": str(redis_port),
+            "MINIO_ENDPOINT": f"127.0.0.1:{s3_port}",
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(self._smtp.port),
+            # Profiles written by the in-process app are removed with the stand-ins
+            "PROFILE_DIR": os.path.join(self._workdir.name, "profiles"),
+            # Every in-process request comes from the same client address
+            "RATE_LIMIT_IP_BURST": os.environ.get("RATE_LIMIT_IP_BURST", "100000"),
+        }
+        return self.environ
+
+    def stop(self) -> None:
+        if self._smtp is not None:
+            self._smtp.stop()
+        if self._s3 is not None:
+            self._s3.stop()
+        if self._redis is not None:
+            self._redis.shutdown()
+            self._redis.server_close()
+        if self._workdir is not None:
+            self._workdir.cleanup()
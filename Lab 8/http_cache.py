@@ -0,0 +1,167 @@
+"""
+HTTP Caching for Lab 8
+======================
+
+This module lets routes declare an HTTP caching policy and provides the
+middleware that applies it:
+
+- Routes whose output depends only on the URL (e.g. /cube/{number}) are
+  decorated with @cache_policy(...). Undecorated routes are never touched.
+- Successful GET/HEAD responses of those routes get a Cache-Control header
+  and a strong ETag computed from the response body.
+- A request whose If-None-Match matches the ETag gets an empty
+  304 Not Modified instead of the full body.
+
+The middleware should wrap the compression middleware, so the ETag is
+computed over the bytes that actually go on the wire (after compression). gzip and
+brotli output is deterministic, so every encoding gets its own stable ETag.
+"""
+
+import hashlib
+from typing import Callable, List, Optional, Tuple
+
+
+class CachePolicy:
+    """Cache-Control settings for one route."""
+
+    def __init__(self, max_age: int, public: bool = True, immutable: bool = False):
+        self.max_age = max_age
+        self.public = public
+        self.immutable = immutable
+        directives = ["public" if public else "private", f"max-age={max_age}"]
+        if immutable:
+            directives.append("immutable")
+        self.header_value = ", ".join(directives).encode("latin-1")
+
+
+def cache_policy(max_age: int, public: bool = True, immutable: bool = False) -> Callable:
+    """
+    Mark a route function as cacheable.
+
+    Place it below the @app.get(...) decorator:
+
+        @app.get("/cube/{number}")
+        @cache_policy(max_age=86400, immutable=True)
+        async def cube(number: int): ...
+
+    Args:
+        max_age: Seconds clients and shared caches may reuse the response
+        public: Whether shared caches (CDNs, proxies) may store it
+        immutable: Whether the response can never change for this URL
+
+    Returns:
+        Decorator that attaches the policy to the function
+    """
+    def decorator(func: Callable) -> Callable:
+        func.cache_policy = CachePolicy(max_age, public, immutable)
+        return func
+    return decorator
+
+
+def compute_etag(body: bytes) -> bytes:
+    """
+    Compute a strong ETag for a response body.
+
+    Args:
+        body: Exact response bytes
+
+    Returns:
+        Quoted ETag value
+    """
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode("ascii") + b'"'
+
+
+def if_none_match_matches(header: str, etag: bytes) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, RFC 9110).
+
+    Args:
+        header: Raw If-None-Match header value
+        etag: Quoted ETag of the current representation
+
+    Returns:
+        True if the client's cached copy is still current
+    """
+    header = header.strip()
+    if header == "*":
+        return True
+    target = etag.decode("ascii")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+# Headers a 304 must repeat from the 200 it stands in for (RFC 9110 15.4.5)
+_NOT_MODIFIED_HEADERS = (b"cache-control", b"content-location", b"date", b"etag", b"expires", b"vary")
+
+
+class HTTPCacheMiddleware:
+    """ASGI middleware that adds Cache-Control/ETag and answers If-None-Match with 304."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+                break
+
+        start_message = None
+        policy: Optional[CachePolicy] = None
+        chunks: List[bytes] = []
+
+        async def send_wrapper(message):
+            nonlocal start_message, policy
+            if message["type"] == "http.response.start":
+                # The router has matched by now and stored the endpoint in scope
+                endpoint = scope.get("endpoint")
+                policy = getattr(endpoint, "cache_policy", None)
+                if policy is None or message["status"] != 200:
+                    policy = None
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if policy is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers: List[Tuple[bytes, bytes]] = list(start_message.get("headers", []))
+            existing = [v for k, v in headers if k.lower() == b"etag"]
+            if existing:
+                etag = existing[0]
+            elif scope["method"] == "HEAD":
+                # HEAD has no body to hash; pass it through with the policy only
+                etag = None
+            else:
+                etag = compute_etag(body)
+                headers.append((b"etag", etag))
+            headers = [(k, v) for k, v in headers if k.lower() != b"cache-control"]
+            headers.append((b"cache-control", policy.header_value))
+
+            if etag is not None and if_none_match is not None and if_none_match_matches(if_none_match, etag):
+                kept = [(k, v) for k, v in headers if k.lower() in _NOT_MODIFIED_HEADERS]
+                await send({"type": "http.response.start", "status": 304, "headers": kept})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,288 @@
+"""
+Object Inventory for Lab 8
+==========================
+
+This module keeps a local SQLite index of what is in a MinIO bucket, so
+counts, sizes and listings under a prefix are answered without listing
+the bucket again:
+
+- refresh() lists the bucket in parallel. It first lists the top levels
+  with a "/" delimiter (`depth` levels deep) to find the sub-prefixes,
+  then lists every sub-prefix recursively in its own thread. Pages of
+  results are written to SQLite by the calling thread as they arrive.
+- A refresh can cover just one prefix. Objects under it that weren't
+  seen by the listing are removed from the index; the rest of the index
+  is left alone.
+- refresh_if_stale() only re-lists a prefix that hasn't been refreshed
+  within `max_age` seconds.
+- record_put() and record_delete() update the index when this process
+  writes to the bucket, so it stays current between refreshes.
+- Objects are keyed by (bucket, name), so prefix queries are range scans
+  of the primary key.
+
+The index lives in MINIO_INVENTORY_DB (.minio_inventory.sqlite3 by default).
+"""
+
+import os
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from storage import DEFAULT_WORKERS, get_client
+from tracing import traced
+
+DEFAULT_INVENTORY_DB = os.environ.get("MINIO_INVENTORY_DB", ".minio_inventory.sqlite3")
+# Rows written per transaction while refreshing
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified REAL,
+    seen REAL NOT NULL,
+    PRIMARY KEY (bucket, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS refreshes (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    objects INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (bucket, prefix)
+);
+"""
+
+UPSERT_OBJECT = """
+INSERT INTO objects (bucket, name, size, etag, last_modified, seen) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (bucket, name) DO UPDATE SET
+    size = excluded.size, etag = excluded.etag, last_modified = excluded.last_modified, seen = excluded.seen
+"""
+
+
+def _prefix_bounds(prefix: str) -> Tuple[str, Optional[str]]:
+    """
+    Get the name range [low, high) of every name starting with prefix.
+
+    SQLite compares text as UTF-8 bytes, which sorts like code points, so
+    bumping the last character gives the first name past the prefix.
+    """
+    if not prefix:
+        return "", None
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class ObjectInventory:
+    """Local index of the objects in one bucket."""
+
+    def __init__(self, bucket_name: str = "lab8-bucket", db_path: str = DEFAULT_INVENTORY_DB,
+                 client=None, workers: int = DEFAULT_WORKERS):
+        """
+        Args:
+            bucket_name: Bucket to index
+            db_path: SQLite file holding the index
+            client: Minio client (defaults to the shared one)
+            workers: Prefixes listed in parallel
+        """
+        self.bucket_name = bucket_name
+        self.client = client or get_client()
+        self.workers = workers
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _where_prefix(self, prefix: str) -> Tuple[str, list]:
+        low, high = _prefix_bounds(prefix)
+        if high is None:
+            return "bucket = ? AND name >= ?", [self.bucket_name, low]
+        return "bucket = ? AND name >= ? AND name < ?", [self.bucket_name, low, high]
+
+    def _row(self, obj, seen: float) -> tuple:
+        modified = obj.last_modified.timestamp() if obj.last_modified is not None else None
+        return (self.bucket_name, obj.object_name, obj.size or 0, obj.etag, modified, seen)
+
+    def _partitions(self, prefix: str, depth: int) -> Tuple[list, List[str]]:
+        """
+        Split a prefix into sub-prefixes to list in parallel.
+
+        Returns:
+            Tuple of (objects found directly on the way down, sub-prefixes)
+        """
+        if depth <= 0:
+            return [], [prefix]
+        objects, prefixes = [], []
+        for obj in self.client.list_objects(self.bucket_name, prefix=prefix or None, recursive=False):
+            if obj.is_dir:
+                sub_objects, sub_prefixes = self._partitions(obj.object_name, depth - 1)
+                objects.extend(sub_objects)
+                prefixes.extend(sub_prefixes)
+            else:
+                objects.append(obj)
+        return objects, prefixes
+
+    def _list_prefix(self, prefix: str, seen: float, pages: queue.Queue) -> None:
+        batch = []
+        try:
+            for obj in self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True):
+                batch.append(self._row(obj, seen))
+                if len(batch) >= BATCH_SIZE:
+                    pages.put(batch)
+                    batch = []
+        finally:
+            # Also sent on failure, so the writer never waits forever
+            pages.put(batch)
+            pages.put(None)
+
+    def _write(self, rows: List[tuple]) -> None:
+        if rows:
+            with self.conn:
+                self.conn.executemany(UPSERT_OBJECT, rows)
+
+    @traced("inventory.refresh", kind="client")
+    def refresh(self, prefix: str = "", depth: int = 1) -> Dict[str, float]:
+        """
+        List a prefix of the bucket in parallel and update the index.
+
+        Args:
+            prefix: Part of the bucket to re-list ("" for all of it)
+            depth: "/" levels to split into sub-prefixes listed in parallel
+
+        Returns:
+            Dictionary with the objects listed, the objects removed from
+            the index and the seconds taken
+        """
+        started = time.time()
+        objects, prefixes = self._partitions(prefix, depth)
+        self._write([self._row(obj, started) for obj in objects])
+        listed = len(objects)
+
+        pages: queue.Queue = queue.Queue()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = [executor.submit(self._list_prefix, sub_prefix, started, pages) for sub_prefix in prefixes]
+            finished = 0
+            while finished < len(futures):
+                rows = pages.get()
+                if rows is None:
+                    finished += 1
+                    continue
+                self._write(rows)
+                listed += len(rows)
+            for future in futures:
+                future.result()
+
+        # Everything under the prefix was listed, so what wasn't seen is gone
+        where, params = self._where_prefix(prefix)
+        elapsed = time.time() - started
+        with self.conn:
+            removed = self.conn.execute(f"DELETE FROM objects WHERE {where} AND seen < ?",
+                                        params + [started]).rowcount
+            self.conn.execute("INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, ?, ?)",
+                              (self.bucket_name, prefix, started, listed, elapsed))
+        return {"listed": listed, "removed": removed, "seconds": elapsed}
+
+    def refreshed_at(self, prefix: str = "") -> Optional[float]:
+        """
+        Get when a prefix was last listed, counting refreshes of any
+        prefix that contains it.
+
+        Returns:
+            Unix timestamp, or None if it never was
+        """
+        rows = self.conn.execute("SELECT prefix, refreshed_at FROM refreshes WHERE bucket = ?",
+                                 (self.bucket_name,)).fetchall()
+        times = [refreshed for covering, refreshed in rows if prefix.startswith(covering)]
+        return max(times) if times else None
+
+    def refresh_if_stale(self, prefix: str = "", max_age: float = 300.0, depth: int = 1) -> bool:
+        """
+        Refresh a prefix only if it wasn't listed within max_age seconds.
+
+        Returns:
+            True if the prefix was re-listed
+        """
+        refreshed = self.refreshed_at(prefix)
+        if refreshed is not None and time.time() - refreshed < max_age:
+            return False
+        self.refresh(prefix, depth)
+        return True
+
+    def record_put(self, name: str, size: int, etag: Optional[str] = None,
+                   last_modified: Optional[float] = None) -> None:
+        """Add or update an object this process has just uploaded."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(UPSERT_OBJECT, (self.bucket_name, name, size, etag, last_modified or now, now))
+
+    def record_delete(self, name: str) -> None:
+        """Remove an object this process has just deleted."""
+        with self.conn:
+            self.conn.execute("DELETE FROM objects WHERE bucket = ? AND name = ?", (self.bucket_name, name))
+
+    def summary(self, prefix: str = "") -> Dict[str, int]:
+        """
+        Count the objects under a prefix.
+
+        Returns:
+            Dictionary with the number of objects and their total bytes
+        """
+        where, params = self._where_prefix(prefix)
+        count, size = self.conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE {where}",
+                                        params).fetchone()
+        return {"objects": count, "bytes": size}
+
+    def list_objects(self, prefix: str = "", limit: Optional[int] = None,
+                     start_after: str = "") -> List[Dict]:
+        """
+        List indexed objects under a prefix, in name order.
+
+        Args:
+            prefix: Name prefix
+            limit: Maximum objects returned (all if None)
+            start_after: Only names after this one, for paging
+
+        Returns:
+            List of dictionaries with name, size, etag and last_modified
+        """
+        where, params = self._where_prefix(prefix)
+        sql = f"SELECT name, size, etag, last_modified FROM objects WHERE {where} AND name > ? ORDER BY name"
+        params.append(start_after)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [{"name": name, "size": size, "etag": etag, "last_modified": modified}
+                for name, size, etag, modified in self.conn.execute(sql, params)]
+
+    def prefixes(self, prefix: str = "", delimiter: str = "/") -> List[Dict]:
+        """
+        Break down a prefix by its next level, like a delimited listing.
+
+        Args:
+            prefix: Name prefix, e.g. "reports/"
+            delimiter: Separator between levels
+
+        Returns:
+            List of dictionaries with the child prefix (or object name),
+            its number of objects and its total bytes, in name order
+        """
+        where, params = self._where_prefix(prefix)
+        rows = self.conn.execute(
+            f"""SELECT CASE WHEN instr(rest, ?) > 0 THEN substr(rest, 1, instr(rest, ?) + length(?) - 1)
+                            ELSE rest END AS child, COUNT(*), SUM(size)
+                FROM (SELECT substr(name, ?) AS rest, size FROM objects WHERE {where})
+                GROUP BY child ORDER BY child""",
+            [delimiter, delimiter, delimiter, len(prefix) + 1] + params).fetchall()
+        return [{"prefix": prefix + child, "objects": count, "bytes": size} for child, count, size in rows]
+
+    def largest(self, prefix: str = "", count: int = 10) -> List[Dict]:
+        """Get the biggest indexed objects under a prefix."""
+        where, params = self._where_prefix(prefix)
+        rows = self.conn.execute(f"SELECT name, size FROM objects WHERE {where} ORDER BY size DESC LIMIT ?",
+                                 params + [count]).fetchall()
+        return [{"name": name, "size": size} for name, size in rows]
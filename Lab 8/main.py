@@ -1,38 +1,265 @@
-from fastapi import FastAPI, Header, HTTPException, Cookie
-from pydantic import BaseModel
-from typing import Optional
+import math
+import os
+from tempfile import SpooledTemporaryFile
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Cookie, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import QueryParams
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Annotated, List, Literal, Optional, Union
+from database_utils import (
+    connect_to_db, close_connection, execute_query_with_headers,
+    open_query_stream, iter_rows_as_ndjson, iter_rows_as_csv,
+    get_query_by_key, list_all_queries
+)
+from serialization import get_response_class, get_dumps
+from compression import CompressionMiddleware, choose_encoding
+from http_cache import HTTPCacheMiddleware, cache_policy, if_none_match_matches
+from metrics import MetricsMiddleware, REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from tracing import TracingMiddleware
+from profiling import PROFILING, PROFILE_MODES, ProfilingMiddleware
+from rate_limit import RateLimitMiddleware, RateLimiter, RateLimitRule, InMemoryBackend, RedisBackend
+from coalescing import SingleFlight
+from cities import load_cities
+from batch_compute import cube_many, power_many, add_many, area_many
+from bulk import BulkValidator, LineTooLongError, describe_error, encode_ndjson, iter_spooled
+from pydantic import ValidationError
+from api_keys import ApiKeyStore
+from tiered_cache import TieredCache
+from sessions import SESSION_COOKIE, SessionStore, RedisSessionBackend, InMemorySessionBackend
+from snapshots import (DEFAULT_BUCKET as SNAPSHOT_BUCKET, DEFAULT_PREFIX as SNAPSHOT_PREFIX, latest_manifest,
+                       iter_snapshot, iter_gunzip)
+from minio.error import S3Error
+import urllib3
+import redis
+import redis.asyncio
 
-app = FastAPI()
+# Bootstrap key with every scope; set API_KEY to something secret when deployed
+API_KEY = os.environ.get("API_KEY", "mysecretkey")
 
-API_KEY = "mysecretkey"
+# Database settings for the report routes. Inside Docker Compose the MySQL
+# service is reachable as "mysql:3306" rather than "localhost:3307".
+DB_HOST = os.environ.get("DB_HOST", "localhost")
+DB_PORT = int(os.environ.get("DB_PORT", "3307"))
+
+# Redis is optional: without REDIS_HOST, features that can share state
+# through Redis (like rate limiting) keep it in process instead.
+REDIS_HOST = os.environ.get("REDIS_HOST")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
+
+# One asyncio client is shared by the rate limiter and the session store
+async_redis = (redis.asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, socket_timeout=0.5,
+                                   socket_connect_timeout=0.5) if REDIS_HOST else None)
+# ...and one blocking client by the API key store and the report cache
+sync_redis = (redis.Redis(host=REDIS_HOST, port=REDIS_PORT, socket_timeout=0.5, socket_connect_timeout=0.5)
+              if REDIS_HOST else None)
+
+# Sessions for /cookie-greet. SESSION_SECRET signs the session cookie and
+# must be the same on every instance.
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "lab8-session-secret")
+SESSION_TTL = int(os.environ.get("SESSION_TTL_SECONDS", "1800"))
+SESSION_COOKIE_SECURE = os.environ.get("SESSION_COOKIE_SECURE", "false").lower() == "true"
+SESSIONS = SessionStore(
+    RedisSessionBackend(async_redis) if async_redis else InMemorySessionBackend(),
+    secret=SESSION_SECRET,
+    ttl=SESSION_TTL,
+)
+
+# API keys: the bootstrap API_KEY always works; more keys with scopes can
+# be created through /admin/api-keys when Redis is available.
+API_KEYS = ApiKeyStore(
+    sync_redis,
+    bootstrap_key=API_KEY,
+    ttl=float(os.environ.get("API_KEY_CACHE_TTL", "60")),
+    refresh_interval=float(os.environ.get("API_KEY_REFRESH_SECONDS", "30")),
+)
+
+# JSON report results: an in-process LRU per worker in front of Redis, kept
+# coherent across workers with pub/sub. Clear it through /admin/caches after
+# changing the data behind the reports.
+REPORT_CACHE = TieredCache(
+    "reports",
+    sync_redis,
+    max_entries=int(os.environ.get("REPORT_CACHE_ENTRIES", "256")),
+    local_ttl=float(os.environ.get("REPORT_CACHE_LOCAL_SECONDS", "30")),
+    ttl=float(os.environ.get("REPORT_CACHE_SECONDS", "300")),
+)
+CACHES = {"reports": REPORT_CACHE}
+
+# Pure math results never change for a given URL; the lookup tables may
+# change between deployments, so they get a shorter lifetime.
+MATH_CACHE_SECONDS = 86400
+DATA_CACHE_SECONDS = 3600
+
+# Factorials and powers at least this big are shared between identical
+# concurrent requests; smaller ones are cheaper to compute inline.
+FACTORIAL_COALESCE_MIN_N = int(os.environ.get("FACTORIAL_COALESCE_MIN_N", "1000"))
+POWER_COALESCE_MIN_EXP = int(os.environ.get("POWER_COALESCE_MIN_EXP", "10000"))
+
+# Largest /factorial or /power result, in decimal digits. Turning an int
+# into JSON text takes time quadratic in its length, so bigger results are
+# refused before they are computed.
+MAX_RESULT_DIGITS = int(os.environ.get("MAX_RESULT_DIGITS", "100000"))
+
+# /person/bulk keeps NDJSON results in memory up to this size, then on disk
+BULK_SPOOL_BYTES = int(os.environ.get("BULK_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+# Largest number of inputs accepted by one /batch request
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "10000"))
+
+# /batch requests are charged one rate limit token per this many result
+# digits, close to what /factorial costs for the same output
+BATCH_DIGITS_PER_TOKEN = int(os.environ.get("BATCH_DIGITS_PER_TOKEN", "2500"))
+
+# City facts for /city and /cities/autocomplete, loaded and indexed once
+CITIES = load_cities()
+
+REPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    API_KEYS.start()
+    REPORT_CACHE.start()
+    yield
+    REPORT_CACHE.stop()
+    API_KEYS.stop()
+
+# The JSON encoder (orjson, msgspec or stdlib) is picked once at startup and
+# can be overridden with the JSON_SERIALIZER environment variable.
+app = FastAPI(default_response_class=get_response_class(), lifespan=lifespan)
+
+# Innermost, so a profiled request covers the handler plus compression.
+# Idle until armed through POST /admin/profiling.
+app.add_middleware(ProfilingMiddleware)
+
+# Compress responses of at least COMPRESSION_MIN_SIZE bytes (large factorials,
+# powers and reports) with brotli or gzip, whichever the client prefers.
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4")),
+)
+
+# Outside compression, so ETags are computed over the final, possibly
+# compressed, bytes. Only routes marked with @cache_policy are cached.
+app.add_middleware(HTTPCacheMiddleware)
+
+# Middleware added later wraps the ones above; the order from the outside
+# in is: tracing, metrics, rate limiting, caching, compression, profiling.
+
+def factorial_cost(n: int) -> float:
+    return 1 + max(n, 0) // 1000
+
+def power_cost(exp: int) -> float:
+    return 1 + max(exp, 0) // 10000
+
+def request_cost(scope) -> float:
+    """Tokens a request costs: big factorials and powers are charged more."""
+    parts = scope["path"].strip("/").split("/")
+    try:
+        if len(parts) == 2 and parts[0] == "factorial":
+            return factorial_cost(int(parts[1]))
+        if len(parts) == 2 and parts[0] == "power":
+            # Parsed the way FastAPI reads ?exp=, percent-escapes included
+            return power_cost(int(QueryParams(scope["query_string"]).get("exp") or 2))
+    except ValueError:
+        pass
+    return 1
+
+# Shared by the middleware and the /ws/compute WebSocket, which charges
+# every message against the same buckets
+RATE_LIMITER = RateLimiter(
+    RedisBackend(async_redis) if async_redis else InMemoryBackend(),
+    ip_rule=RateLimitRule(
+        capacity=float(os.environ.get("RATE_LIMIT_IP_BURST", "100")),
+        rate=float(os.environ.get("RATE_LIMIT_IP_PER_SECOND", "20")),
+    ),
+    key_rule=RateLimitRule(
+        capacity=float(os.environ.get("RATE_LIMIT_KEY_BURST", "200")),
+        rate=float(os.environ.get("RATE_LIMIT_KEY_PER_SECOND", "50")),
+    ),
+)
+
+# Inside metrics, so 429s are counted, but outside caching and compression
+# so rejected requests cost as little as possible.
+app.add_middleware(RateLimitMiddleware, limiter=RATE_LIMITER, cost=request_cost)
+
+# Latency and response size cover the whole stack below (including 429s,
+# 304s and compressed bodies). app.routes is passed by reference,
+# so routes declared below are picked up too.
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+# Server span per request, continuing the caller's trace if it sent a
+# traceparent header. Spans are only recorded when TRACE_EXPORT is set.
+app.add_middleware(TracingMiddleware)
 
 # 1. Root route
 @app.get("/")
+@cache_policy(max_age=DATA_CACHE_SECONDS)
 async def root():
     return {"message": "Welcome to Lab 2 FastAPI Service!"}
 
 # 2. Query string: /greet?name=Aniket
 @app.get("/greet")
+@cache_policy(max_age=DATA_CACHE_SECONDS)
 async def greet(name: str = "Guest"):
     return {"greeting": f"Hello, {name}!"}
 
 # 3. Path param: /cube/3
 @app.get("/cube/{number}")
+@cache_policy(max_age=MATH_CACHE_SECONDS, immutable=True)
 async def cube(number: int):
     return {"number": number, "cube": number ** 3}
 
 # 4. Query string math: /add?a=5&b=7
 @app.get("/add")
+@cache_policy(max_age=MATH_CACHE_SECONDS, immutable=True)
 async def add(a: int, b: int):
     return {"sum": a + b}
 
+def factorial_digits(n: int) -> float:
+    try:
+        return math.lgamma(n + 1) / math.log(10) if n > 1 else 1
+    except OverflowError:
+        # n doesn't fit in a float, so the result is far past any digit limit
+        return math.inf
+
+def power_digits(base: int, exp: int) -> float:
+    # Negative exponents give floats, and 0, 1 and -1 never grow
+    try:
+        return exp * math.log10(abs(base)) if exp > 0 and abs(base) > 1 else 1
+    except OverflowError:
+        return math.inf
+
+def check_result_digits(digits: float):
+    if digits > MAX_RESULT_DIGITS:
+        raise HTTPException(status_code=400, detail=f"Result would have more than {MAX_RESULT_DIGITS} digits.")
+
 # 5. Path param calculation: /factorial/5
 @app.get("/factorial/{n}")
+@cache_policy(max_age=MATH_CACHE_SECONDS, immutable=True)
 async def factorial(n: int):
+    check_result_digits(factorial_digits(n))
+    if n >= FACTORIAL_COALESCE_MIN_N:
+        result = await factorial_flight.do(n, compute_factorial, n)
+    else:
+        result = compute_factorial(n)
+    return {"n": n, "factorial": result}
+
+def compute_factorial(n: int) -> int:
     result = 1
     for i in range(2, n+1):
         result *= i
-    return {"n": n, "factorial": result}
+    return result
+
+factorial_flight = SingleFlight("factorial")
 
 # 6. POST with Pydantic: /person
 class Person(BaseModel):
@@ -41,23 +268,68 @@ class Person(BaseModel):
 
 @app.post("/person")
 async def person_info(person: Person):
-    status = "minor" if person.age < 18 else "adult"
+    status = person_status(person.age)
     return {
         "message": f"{person.name} is {person.age} years old and is an {status}."
     }
 
+def person_status(age: int) -> str:
+    return "minor" if age < 18 else "adult"
+
+# 6b. Bulk POST: /person/bulk with a JSON array or an NDJSON stream of people.
+# Results stream back as NDJSON: one {"name", "age", "status"} line per
+# person, or {"line", "error"} for an invalid NDJSON line.
+person_validator = BulkValidator(Person, batch_size=1000)
+ndjson_dumps = get_dumps()
+
+def classify_people(people) -> list:
+    return [{"name": p.name, "age": p.age, "status": person_status(p.age)} for p in people]
+
+@app.post("/person/bulk")
+async def person_bulk(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        # Lines are validated while the upload arrives. Results are spooled
+        # (to disk past BULK_SPOOL_BYTES) and sent once the upload is done,
+        # since clients like requests only read after sending everything.
+        results = SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+        try:
+            async for batch in person_validator.iter_ndjson(request.stream()):
+                results.write(encode_ndjson([
+                    {"line": number, "error": error} if error else classify_people([person])[0]
+                    for number, person, error in batch
+                ], ndjson_dumps))
+        except LineTooLongError as error:
+            results.close()
+            raise HTTPException(status_code=413, detail=str(error))
+        return StreamingResponse(iter_spooled(results), media_type=REPORT_MEDIA_TYPES["ndjson"])
+
+    body = await request.body()
+    try:
+        people = await run_in_threadpool(person_validator.validate_array, body)
+    except ValidationError as error:
+        raise RequestValidationError(error.errors(include_url=False))
+
+    def array_results():
+        for start in range(0, len(people), person_validator.batch_size):
+            yield encode_ndjson(classify_people(people[start:start + person_validator.batch_size]), ndjson_dumps)
+    return StreamingResponse(array_results(), media_type=REPORT_MEDIA_TYPES["ndjson"])
+
 # 7. Path route with string: /city/Boston
 @app.get("/city/{city_name}")
+@cache_policy(max_age=DATA_CACHE_SECONDS)
 async def city_info(city_name: str):
-    facts = {
-        "boston": "Boston is a city that experiences all four seasons.",
-        "newyork": "New York is a very busy place with lots of tall buildings.",
-        "seattle": "Seattle gets a fair amount of rain each year.",
-        "miami": "Miami is known for being warm and having many beaches.",
-        "dallas": "Dallas is located in Texas and is pretty big."
-    }
-    info = facts.get(city_name.lower(), "No info for this city.")
-    return {"city": city_name, "info": info}
+    city = CITIES.lookup(city_name)
+    if city is None:
+        return {"city": city_name, "info": "No info for this city."}
+    return {"city": city_name, "info": city.info, "match": city.name}
+
+# 7b. Autocomplete: /cities/autocomplete?q=bos
+@app.get("/cities/autocomplete")
+@cache_policy(max_age=DATA_CACHE_SECONDS)
+async def autocomplete_cities(q: str, limit: int = 5):
+    limit = max(1, min(limit, CITIES.max_suggestions))
+    return {"query": q, "suggestions": [city.to_dict() for city in CITIES.autocomplete(q, limit)]}
 
 # 8. POST: Calculate area
 class Rectangle(BaseModel):
@@ -70,25 +342,450 @@ async def rectangle_area(rect: Rectangle):
 
 # 9. Path and Query: /power/2?exp=8
 @app.get("/power/{base}")
+@cache_policy(max_age=MATH_CACHE_SECONDS, immutable=True)
 async def power(base: int, exp: int = 2):
-    return {"base": base, "exp": exp, "result": base ** exp}
+    check_result_digits(power_digits(base, exp))
+    if exp >= POWER_COALESCE_MIN_EXP:
+        result = await power_flight.do((base, exp), compute_power, base, exp)
+    else:
+        try:
+            result = compute_power(base, exp)
+        except ArithmeticError as error:
+            # 0 to a negative power, or a base too large for a float
+            raise HTTPException(status_code=400, detail=str(error))
+    return {"base": base, "exp": exp, "result": result}
+
+def compute_power(base: int, exp: int):
+    return base ** exp
+
+power_flight = SingleFlight("power")
 
 # 10. GET list: /colors
 @app.get("/colors")
+@cache_policy(max_age=DATA_CACHE_SECONDS)
 async def list_colors():
     return {"colors": ["red", "blue", "green", "yellow"]}
 
+async def require_api_key(api_key: Optional[str], scope: str = "admin"):
+    # Cached keys are checked inline; only a cache miss goes to Redis
+    hit, key = API_KEYS.authenticate_cached(api_key)
+    if not hit:
+        key = await run_in_threadpool(API_KEYS.authenticate, api_key)
+    if key is None:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key.")
+    if not key.allows(scope):
+        raise HTTPException(status_code=403, detail=f"API key lacks the {scope} scope.")
+    return key
+
 # 11. Header: /protected-data
 @app.get("/protected-data")
 async def protected_data(api_key: Optional[str] = Header(None)):
-    if api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid or missing API key.")
+    await require_api_key(api_key, "data:read")
     return {"data": "This is protected data."}
 
 # 12. Cookie: /cookie-greet
+# The visitor's name lives in a server-side session; the browser only holds
+# the signed session id. An old-style "username" cookie starts a session.
 @app.get("/cookie-greet")
-async def personal_greet(username: Optional[str] = Cookie(None)):
-    if username:
-        return {"greeting": f"Welcome back, {username}!"}
-    else:
+async def personal_greet(response: Response, username: Optional[str] = Cookie(None),
+                         session: Optional[str] = Cookie(None)):
+    session_id, data = await SESSIONS.load(session)
+    if "username" not in data and username:
+        data["username"] = username
+    if "username" not in data:
         return {"greeting": "Hello, new visitor!"}
+    data["visits"] = data.get("visits", 0) + 1
+    set_session_cookie(response, await SESSIONS.save(session_id, data))
+    return {"greeting": f"Welcome back, {data['username']}!", "visits": data["visits"]}
+
+class SessionRequest(BaseModel):
+    username: str
+
+@app.post("/session")
+async def start_session(request: SessionRequest, response: Response, session: Optional[str] = Cookie(None)):
+    # Always issue a new session id on login, never reuse the old one
+    old_session_id, _ = await SESSIONS.load(session)
+    await SESSIONS.delete(old_session_id)
+    set_session_cookie(response, await SESSIONS.save(None, {"username": request.username}))
+    return {"username": request.username}
+
+@app.delete("/session")
+async def end_session(response: Response, session: Optional[str] = Cookie(None)):
+    session_id, _ = await SESSIONS.load(session)
+    await SESSIONS.delete(session_id)
+    response.delete_cookie(SESSION_COOKIE)
+    return {"logged_out": session_id is not None}
+
+def set_session_cookie(response: Response, cookie: str):
+    response.set_cookie(SESSION_COOKIE, cookie, max_age=SESSION_TTL, httponly=True,
+                        samesite="lax", secure=SESSION_COOKIE_SECURE)
+
+# 13. GET list: /reports
+@app.get("/reports")
+async def list_reports():
+    return {"reports": list_all_queries()}
+
+# 14. Report: /reports/simple_1?format=ndjson
+# Plain "def" so the blocking MySQL calls run in the threadpool.
+@app.get("/reports/{query_key}")
+def run_report(query_key: str, format: str = "json"):
+    query_info = get_query_by_key(query_key)
+    if not query_info:
+        raise HTTPException(status_code=404, detail=f"Unknown report '{query_key}'.")
+    if format != "json" and format not in REPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be json, ndjson or csv.")
+
+    if format == "json":
+        return REPORT_CACHE.get_or_load(query_key, lambda: load_report(query_key, query_info))
+
+    mydb = connect_to_db(host=DB_HOST, port=DB_PORT)
+    if mydb is None:
+        raise HTTPException(status_code=503, detail="Database is not available.")
+
+    stream = open_query_stream(mydb, query_info["query"])
+    if stream is None:
+        close_connection(mydb)
+        raise HTTPException(status_code=500, detail="Query failed.")
+    headers, rows = stream
+    encode = iter_rows_as_ndjson if format == "ndjson" else iter_rows_as_csv
+
+    def body():
+        # StreamingResponse pulls one chunk at a time and waits for it to be
+        # sent before asking for the next, so a slow client throttles how
+        # fast rows are fetched from MySQL.
+        try:
+            yield from encode(headers, rows)
+        finally:
+            rows.close()
+            close_connection(mydb)
+
+    return StreamingResponse(body(), media_type=REPORT_MEDIA_TYPES[format])
+
+def load_report(query_key: str, query_info: dict) -> dict:
+    mydb = connect_to_db(host=DB_HOST, port=DB_PORT)
+    if mydb is None:
+        raise HTTPException(status_code=503, detail="Database is not available.")
+    try:
+        result = execute_query_with_headers(mydb, query_info["query"])
+    finally:
+        close_connection(mydb)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Query failed.")
+    rows = [dict(zip(result["headers"], row)) for row in result["data"]]
+    # Encoded now (Decimals, dates) so a cached copy is sent exactly as a fresh one
+    return jsonable_encoder({"report": query_key, "name": query_info["name"], "rows": rows})
+
+# 15. Metrics: /metrics (Prometheus text exposition format)
+@app.get("/metrics")
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+# 16. Admin: profiling control (requires the api-key header)
+class ProfilingRequest(BaseModel):
+    enabled: bool = True
+    mode: str = "sampling"
+    path_prefix: str = "/"
+    requests: int = 1
+    interval_ms: Optional[float] = None
+
+
+@app.get("/admin/profiling")
+async def profiling_status(api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    return PROFILING.status()
+
+@app.post("/admin/profiling")
+async def configure_profiling(request: ProfilingRequest, api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    if not request.enabled:
+        PROFILING.disarm()
+    elif request.mode not in PROFILE_MODES or request.requests < 1:
+        raise HTTPException(status_code=400, detail="mode must be sampling or deterministic and requests >= 1.")
+    else:
+        PROFILING.arm(request.mode, request.path_prefix, request.requests, request.interval_ms)
+    return PROFILING.status()
+
+@app.get("/admin/profiling/{profile_name}")
+async def download_profile(profile_name: str, api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    # Only serve files that list_profiles reports, never arbitrary paths
+    if profile_name not in PROFILING.status()["profiles"]:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(os.path.join(PROFILING.output_dir, profile_name))
+
+# 17. Admin: API keys (requires an api-key with the admin scope)
+class ApiKeyRequest(BaseModel):
+    name: str
+    scopes: List[str] = ["data:read"]
+
+def require_key_store():
+    if API_KEYS.client is None:
+        raise HTTPException(status_code=503, detail="API key store needs Redis (set REDIS_HOST).")
+
+@app.get("/admin/api-keys")
+async def list_api_keys(api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    require_key_store()
+    keys = await run_in_threadpool(API_KEYS.list_keys)
+    return {"keys": [key.to_dict() for key in keys]}
+
+@app.post("/admin/api-keys")
+async def create_api_key(request: ApiKeyRequest, api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    require_key_store()
+    raw_key, key = await run_in_threadpool(API_KEYS.create_key, request.name, request.scopes)
+    # The raw key is only ever shown here
+    return {"api_key": raw_key, **key.to_dict()}
+
+@app.delete("/admin/api-keys/{key_id}")
+async def revoke_api_key(key_id: str, api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    require_key_store()
+    if not await run_in_threadpool(API_KEYS.revoke, key_id):
+        raise HTTPException(status_code=404, detail="API key not found.")
+    return {"revoked": key_id}
+
+# 18. Batch compute: many cubes, powers, sums or areas in one request.
+# The middleware only sees the URL, so each route charges the rate limit
+# for its items once the body is parsed, then computes in the threadpool.
+class CubeBatch(BaseModel):
+    numbers: List[int]
+
+class PowerBatch(BaseModel):
+    bases: List[int]
+    exp: int = 2
+
+class AddBatch(BaseModel):
+    a: List[int]
+    b: List[int]
+
+class RectangleBatch(BaseModel):
+    rectangles: List[Rectangle]
+
+# A float is written with at most 17 significant digits
+FLOAT_DIGITS = 17
+
+def check_batch_size(count: int):
+    if count > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch.")
+
+def batch_cost(digits: float) -> float:
+    return 1 + int(digits) // BATCH_DIGITS_PER_TOKEN
+
+async def charge_rate_limit(request: Request, cost: float):
+    """Take the tokens of a request beyond the 1 the middleware already took."""
+    if cost <= 1:
+        return
+    allowed, _, _, retry_after = await RATE_LIMITER.check(request.scope, cost - 1)
+    if not allowed and math.isinf(retry_after):
+        raise HTTPException(status_code=413, detail="Request costs more than the rate limit allows.")
+    if not allowed:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded. Try again later.",
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+@app.post("/batch/cube")
+async def cube_batch(batch: CubeBatch, request: Request):
+    check_batch_size(len(batch.numbers))
+    await charge_rate_limit(request, batch_cost(sum(power_digits(n, 3) for n in batch.numbers)))
+    return {"count": len(batch.numbers), "cubes": await run_in_threadpool(cube_many, batch.numbers)}
+
+def power_fails(base: int, exp: int) -> bool:
+    try:
+        compute_power(base, exp)
+    except ArithmeticError:
+        return True
+    return False
+
+@app.post("/batch/power")
+async def power_batch(batch: PowerBatch, request: Request):
+    check_batch_size(len(batch.bases))
+    digits = [power_digits(base, batch.exp) for base in batch.bases]
+    check_result_digits(max(digits, default=1))
+    await charge_rate_limit(request, batch_cost(sum(digits)))
+    try:
+        results = await run_in_threadpool(power_many, batch.bases, batch.exp)
+    except ArithmeticError as error:
+        # Only negative exponents fail, and their float results are cheap to redo
+        index = next(i for i, base in enumerate(batch.bases) if power_fails(base, batch.exp))
+        raise HTTPException(status_code=400, detail=f"bases[{index}]: {error}")
+    return {"count": len(batch.bases), "exp": batch.exp, "results": results}
+
+@app.post("/batch/add")
+async def add_batch(batch: AddBatch, request: Request):
+    check_batch_size(len(batch.a))
+    if len(batch.a) != len(batch.b):
+        raise HTTPException(status_code=400, detail="a and b must have the same length.")
+    await charge_rate_limit(request, batch_cost(sum(power_digits(abs(x) + abs(y), 1)
+                                                    for x, y in zip(batch.a, batch.b))))
+    return {"count": len(batch.a), "sums": await run_in_threadpool(add_many, batch.a, batch.b)}
+
+@app.post("/batch/area/rectangle")
+async def rectangle_area_batch(batch: RectangleBatch, request: Request):
+    check_batch_size(len(batch.rectangles))
+    await charge_rate_limit(request, batch_cost(FLOAT_DIGITS * len(batch.rectangles)))
+    areas = await run_in_threadpool(area_many, [(rect.width, rect.height) for rect in batch.rectangles])
+    return {"count": len(batch.rectangles), "areas": areas}
+
+# 19. WebSocket: /ws/compute
+# One connection carries many operations. Each text frame is one operation
+# ({"op": "add", "a": 2, "b": 3, "id": 1}) or a JSON array of them; results
+# come back in order, in the same shape as the REST routes, tagged with the
+# operation's id. Every frame is charged against the rate limit buckets, and
+# an array holds at most BATCH_MAX_ITEMS operations.
+class WsOperation(BaseModel):
+    id: Optional[Union[int, str]] = None
+
+class AddOperation(WsOperation):
+    op: Literal["add"]
+    a: int
+    b: int
+
+class CubeOperation(WsOperation):
+    op: Literal["cube"]
+    number: int
+
+class PowerOperation(WsOperation):
+    op: Literal["power"]
+    base: int
+    exp: int = 2
+
+class FactorialOperation(WsOperation):
+    op: Literal["factorial"]
+    n: int
+
+class AreaOperation(WsOperation):
+    op: Literal["area"]
+    width: float
+    height: float
+
+ComputeOperation = Annotated[
+    Union[AddOperation, CubeOperation, PowerOperation, FactorialOperation, AreaOperation],
+    Field(discriminator="op"),
+]
+ws_operation = TypeAdapter(ComputeOperation)
+ws_operations = TypeAdapter(List[ComputeOperation])
+ws_dumps = get_dumps()
+
+def operation_cost(operation) -> float:
+    if operation.op == "factorial":
+        return factorial_cost(operation.n)
+    if operation.op == "power":
+        return power_cost(operation.exp)
+    return 1
+
+async def run_operation(operation) -> dict:
+    if operation.op == "add":
+        result = await add(operation.a, operation.b)
+    elif operation.op == "cube":
+        result = await cube(operation.number)
+    elif operation.op == "power":
+        result = await power(operation.base, operation.exp)
+    elif operation.op == "factorial":
+        result = await factorial(operation.n)
+    else:
+        result = await rectangle_area(Rectangle(width=operation.width, height=operation.height))
+    return {"id": operation.id, **result}
+
+@app.websocket("/ws/compute")
+async def compute_socket(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        while True:
+            frame = await websocket.receive_text()
+            is_batch = frame.lstrip().startswith("[")
+            try:
+                operations = ws_operations.validate_json(frame) if is_batch else [ws_operation.validate_json(frame)]
+            except ValidationError as error:
+                await websocket.send_text(ws_dumps({"id": None, "error": describe_error(error)}).decode("utf-8"))
+                continue
+            try:
+                check_batch_size(len(operations))
+            except HTTPException as error:
+                await websocket.send_text(ws_dumps({"id": None, "error": error.detail}).decode("utf-8"))
+                continue
+
+            allowed, _, _, retry_after = await RATE_LIMITER.check(
+                websocket.scope, sum(operation_cost(o) for o in operations))
+            if not allowed and math.isinf(retry_after):
+                reply = [{"id": o.id, "error": "Request costs more than the rate limit allows."} for o in operations]
+            elif not allowed:
+                reply = [{"id": o.id, "error": "Rate limit exceeded.", "retry_after": round(retry_after, 3)} for o in operations]
+            else:
+                reply = []
+                for operation in operations:
+                    try:
+                        reply.append(await run_operation(operation))
+                    except (ArithmeticError, ValueError) as error:
+                        reply.append({"id": operation.id, "error": str(error)})
+                    except HTTPException as error:
+                        reply.append({"id": operation.id, "error": error.detail})
+            await websocket.send_text(ws_dumps(reply if is_batch else reply[0]).decode("utf-8"))
+    except WebSocketDisconnect:
+        pass
+
+# 20. Snapshots: /snapshots and /snapshots/group_1
+# Report results precomputed by snapshots.py and read from MinIO, so views
+# don't query MySQL. gzip CSV snapshots are sent as stored, with
+# Content-Encoding: gzip, to clients that accept it.
+# Plain "def" so the blocking MinIO calls run in the threadpool.
+def load_snapshot_manifest() -> dict:
+    try:
+        manifest = latest_manifest(SNAPSHOT_BUCKET, SNAPSHOT_PREFIX)
+    except (S3Error, urllib3.exceptions.HTTPError):
+        raise HTTPException(status_code=503, detail="Snapshot storage is not available.")
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="No snapshots have been published.")
+    return manifest
+
+@app.get("/snapshots")
+def snapshot_manifest():
+    return load_snapshot_manifest()
+
+@app.get("/snapshots/{query_key}")
+def snapshot_report(query_key: str, request: Request):
+    manifest = load_snapshot_manifest()
+    report = manifest["reports"].get(query_key)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No snapshot of report '{query_key}'.")
+
+    # A gzip snapshot sent decoded is a different representation, with its own ETag
+    gunzip = manifest["content_encoding"] == "gzip" and choose_encoding(
+        request.headers.get("accept-encoding", ""), brotli_enabled=False) != "gzip"
+    etag = f'"{report["sha256"]}-identity"' if gunzip else f'"{report["sha256"]}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "X-Snapshot-Run": manifest["run_id"]}
+    if if_none_match_matches(request.headers.get("if-none-match", ""), etag.encode("ascii")):
+        return Response(status_code=304, headers=headers)
+    # Opened before the response starts, so failures get a proper status
+    # instead of a truncated 200
+    try:
+        chunks = iter_snapshot(manifest, query_key, SNAPSHOT_BUCKET)
+    except S3Error as error:
+        if error.code == "NoSuchKey":
+            raise HTTPException(status_code=404, detail=f"Snapshot of report '{query_key}' is missing.")
+        raise HTTPException(status_code=503, detail="Snapshot storage is not available.")
+    except urllib3.exceptions.HTTPError:
+        raise HTTPException(status_code=503, detail="Snapshot storage is not available.")
+    if gunzip:
+        chunks = iter_gunzip(chunks)
+    elif manifest["content_encoding"]:
+        headers["Content-Encoding"] = manifest["content_encoding"]
+    return StreamingResponse(chunks, media_type=manifest["content_type"], headers=headers)
+
+# 21. Admin: caches (requires the api-key header)
+# Hit ratios of each tier, and clearing a cache in every worker
+@app.get("/admin/caches")
+async def cache_stats(api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+@app.delete("/admin/caches/{cache_name}")
+async def clear_cache(cache_name: str, api_key: Optional[str] = Header(None)):
+    await require_api_key(api_key)
+    cache = CACHES.get(cache_name)
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"Unknown cache '{cache_name}'.")
+    try:
+        removed = await run_in_threadpool(cache.clear)
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Redis is not available.")
+    return {"cleared": cache_name, "removed": removed}
@@ -0,0 +1,257 @@
+"""
+Profiling Hooks for Lab 8
+=========================
+
+This module provides opt-in profiling for the FastAPI app and the CLI
+driver, so hot paths such as `factorial` or `format_query_results_as_table`
+can be investigated without redeploying.
+
+Two modes are available:
+
+- "sampling": a background thread records the call stack of every busy
+  thread every few milliseconds. Overhead is low and independent of how
+  many function calls the code makes. Output is in the folded-stack
+  format ("frame;frame;frame count"), which flamegraph.pl, speedscope
+  and inferno can render directly.
+- "deterministic": cProfile records every call on the profiled thread.
+  Output is a .prof file for pstats, snakeviz or flameprof. cProfile only
+  sees the thread it was started on, which for the app is the event loop
+  thread: it covers async routes like /factorial, but sync routes (such as
+  /reports) run in the threadpool and need sampling mode.
+
+In the app, ProfilingMiddleware profiles the next N requests whose path
+matches a prefix. It is armed at runtime through the /admin/profiling
+endpoint. The CLI driver wraps query execution in profile_block() when
+profiling is turned on from its menu or with the PROFILE_MODE variable.
+"""
+
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+PROFILE_MODES = ("sampling", "deterministic")
+
+# Leaf frames that mean a thread is idle rather than doing work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Statistical profiler that periodically samples the stacks of all threads."""
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """
+        Render the samples in folded-stack format.
+
+        Returns:
+            One "root;...;leaf count" line per distinct stack
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfilingConfig:
+    """Runtime profiling settings shared by the app and the CLI driver."""
+
+    def __init__(self):
+        mode = os.environ.get("PROFILE_MODE")
+        self.mode: Optional[str] = mode if mode in PROFILE_MODES else None
+        self.output_dir = os.environ.get("PROFILE_DIR", "profiles")
+        self.interval = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.path_prefix = "/"
+        self.remaining = 0
+        self.active = False
+        self._lock = threading.Lock()
+
+    def arm(self, mode: str, path_prefix: str = "/", requests: int = 1,
+            interval_ms: Optional[float] = None) -> None:
+        """Profile the next `requests` requests whose path starts with `path_prefix`."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        with self._lock:
+            self.mode = mode
+            self.path_prefix = path_prefix
+            self.remaining = requests
+            if interval_ms is not None:
+                self.interval = interval_ms / 1000
+
+    def disarm(self) -> None:
+        with self._lock:
+            self.mode = None
+            self.remaining = 0
+
+    def claim(self, path: str) -> Optional[str]:
+        """
+        Decide whether a request should be profiled and count it if so.
+
+        Only one request is profiled at a time, since overlapping profiles
+        would mix their samples (and cProfile cannot be nested). Call
+        release() when the profiled request finishes.
+
+        Args:
+            path: Request path
+
+        Returns:
+            Profiling mode to use, or None
+        """
+        if self.mode is None or self.remaining <= 0:
+            return None
+        with self._lock:
+            if (self.mode is None or self.remaining <= 0 or self.active
+                    or not path.startswith(self.path_prefix)):
+                return None
+            self.remaining -= 1
+            self.active = True
+            return self.mode
+
+    def release(self) -> None:
+        with self._lock:
+            self.active = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path_prefix": self.path_prefix,
+            "remaining_requests": self.remaining,
+            "interval_ms": self.interval * 1000,
+            "output_dir": self.output_dir,
+            "profiles": list_profiles(self.output_dir),
+        }
+
+
+PROFILING = ProfilingConfig()
+
+
+def _output_path(output_dir: str, label: str, extension: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label).strip("_") or "profile"
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.perf_counter_ns() % 1000000:06d}"
+    return os.path.join(output_dir, f"{safe_label}-{stamp}.{extension}")
+
+
+@contextmanager
+def profile_block(mode: str, label: str, output_dir: Optional[str] = None,
+                  interval: Optional[float] = None) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    Profile a block of code and write the result to a file.
+
+    Args:
+        mode: "sampling" or "deterministic"
+        label: Used in the output file name, e.g. the route path
+        output_dir: Directory for profile files (defaults to PROFILING.output_dir)
+        interval: Sampling interval in seconds (sampling mode only)
+
+    Yields:
+        Dictionary whose 'path' key is set to the written file after the block
+    """
+    output_dir = output_dir or PROFILING.output_dir
+    result: Dict[str, Optional[str]] = {"path": None}
+    if mode == "deterministic":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result["path"] = _output_path(output_dir, label, "prof")
+            profiler.dump_stats(result["path"])
+    else:
+        sampler = SamplingProfiler(interval or PROFILING.interval)
+        sampler.start()
+        try:
+            yield result
+        finally:
+            sampler.stop()
+            result["path"] = _output_path(output_dir, label, "folded")
+            with open(result["path"], "w", encoding="utf-8") as f:
+                f.write(sampler.folded())
+    print(f"Profile written to {result['path']}")
+
+
+def list_profiles(output_dir: Optional[str] = None) -> List[str]:
+    """
+    List profile files, newest first.
+
+    Args:
+        output_dir: Directory to look in (defaults to PROFILING.output_dir)
+
+    Returns:
+        List of file names
+    """
+    output_dir = output_dir or PROFILING.output_dir
+    if not os.path.isdir(output_dir):
+        return []
+    names = [n for n in os.listdir(output_dir) if n.endswith((".prof", ".folded"))]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(output_dir, n)), reverse=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests armed through PROFILING."""
+
+    def __init__(self, app, config: ProfilingConfig = PROFILING):
+        self.app = app
+        self.config = config
+
+    async def __call__(self, scope, receive, send):
+        mode = self.config.claim(scope["path"]) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']}{scope['path']}"
+        try:
+            with profile_block(mode, label, self.config.output_dir, self.config.interval):
+                await self.app(scope, receive, send)
+        finally:
+            self.config.release()
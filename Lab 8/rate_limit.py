@@ -0,0 +1,278 @@
+"""
+Rate Limiting for Lab 8
+=======================
+
+This module provides token-bucket rate limiting for the FastAPI app.
+
+Every request takes tokens from up to two buckets:
+
+- a per-IP bucket, which always applies, and
+- a per-API-key bucket, when the request sends an `api-key` header.
+  Keys are hashed before use, so raw keys never reach Redis.
+
+A bucket holds at most `capacity` tokens and refills at `rate` tokens per
+second. Routes can charge more than one token for expensive requests, for
+example /factorial/{n} with a large n. Responses carry X-RateLimit-Limit
+and X-RateLimit-Remaining for the emptiest bucket; when a bucket runs dry
+the request gets a 429 with a Retry-After header instead. A request that
+costs more than a full bucket could never be allowed, so it gets a 413
+without Retry-After. RateLimiter holds
+the buckets, so WebSocket routes can charge each message against the same
+limits the middleware applies to HTTP requests.
+
+Two backends are available:
+
+- InMemoryBackend keeps the buckets in the process. Each uvicorn worker
+  has its own buckets.
+- RedisBackend keeps them in Redis, so all workers and containers share
+  the same limits. Each check is one atomic Lua script that uses Redis'
+  own clock. The script is sent with the asyncio client, so the event
+  loop never blocks. If Redis is unreachable, the backend falls back to
+  in-memory buckets rather than rejecting or failing every request.
+"""
+
+import hashlib
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio
+
+
+class InMemoryBackend:
+    """Token buckets stored in a dictionary."""
+
+    def __init__(self, max_buckets: int = 100000):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.max_buckets = max_buckets
+
+    def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float, float]:
+        """
+        Try to take `cost` tokens from a bucket.
+
+        Args:
+            key: Bucket identifier
+            capacity: Maximum tokens (burst size)
+            rate: Tokens added per second
+            cost: Tokens this request needs
+
+        Returns:
+            Tuple of (allowed, tokens remaining, seconds until allowed)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._evict_full(now, capacity, rate)
+        return allowed, tokens, retry_after
+
+    def _evict_full(self, now: float, capacity: float, rate: float) -> None:
+        # A bucket that has refilled completely is the same as no bucket
+        refill_time = capacity / rate
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated >= refill_time]
+        for k in stale:
+            del self._buckets[k]
+
+
+# KEYS[1] = bucket key; ARGV = capacity, rate, cost
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RedisBackend:
+    """Token buckets stored in Redis hashes and updated by a Lua script."""
+
+    def __init__(self, client: redis.asyncio.Redis, prefix: str = "ratelimit:",
+                 fallback: Optional[InMemoryBackend] = None, retry_interval: float = 5.0):
+        """
+        Args:
+            client: asyncio Redis client
+            prefix: Key prefix for bucket hashes
+            fallback: Backend used while Redis is unreachable
+            retry_interval: Seconds to wait before trying Redis again after a failure
+        """
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or InMemoryBackend()
+        self.retry_interval = retry_interval
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._down_until = 0.0
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float, float]:
+        """Same contract as InMemoryBackend.take, but a coroutine."""
+        if time.monotonic() < self._down_until:
+            return self.fallback.take(key, capacity, rate, cost)
+        try:
+            allowed, tokens, retry_after = await self._script(keys=[self.prefix + key], args=[capacity, rate, cost])
+        except redis.RedisError as err:
+            print(f"Rate limiter: Redis unavailable ({err}); using in-memory buckets")
+            self._down_until = time.monotonic() + self.retry_interval
+            return self.fallback.take(key, capacity, rate, cost)
+        return bool(int(allowed)), float(tokens), float(retry_after)
+
+
+class RateLimitRule:
+    """Capacity and refill rate for one kind of bucket."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+
+
+def _hash_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _limit_headers(rule: RateLimitRule, remaining: float) -> List[Tuple[bytes, bytes]]:
+    return [
+        (b"x-ratelimit-limit", str(int(rule.capacity)).encode("latin-1")),
+        (b"x-ratelimit-remaining", str(int(remaining)).encode("latin-1")),
+    ]
+
+
+class RateLimiter:
+    """Checks requests against per-IP and per-API-key token buckets."""
+
+    def __init__(self, backend, ip_rule: RateLimitRule, key_rule: RateLimitRule,
+                 trust_forwarded: bool = False):
+        """
+        Args:
+            backend: InMemoryBackend or RedisBackend
+            ip_rule: Bucket settings per client IP
+            key_rule: Bucket settings per API key
+            trust_forwarded: Use the first X-Forwarded-For address as the client IP
+                             (only safe behind a proxy that sets it)
+        """
+        self.backend = backend
+        self.ip_rule = ip_rule
+        self.key_rule = key_rule
+        self.trust_forwarded = trust_forwarded
+
+    def _client_ip(self, scope, headers: Dict[bytes, bytes]) -> str:
+        if self.trust_forwarded and b"x-forwarded-for" in headers:
+            return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def check(self, scope, cost: float = 1.0) -> Tuple[bool, RateLimitRule, float, float]:
+        """
+        Take `cost` tokens from every bucket that applies to a request.
+
+        Args:
+            scope: ASGI scope of the HTTP request or WebSocket connection
+            cost: Tokens to take
+
+        Returns:
+            Tuple of (allowed, rule of the emptiest or rejecting bucket,
+            tokens remaining, seconds until allowed). Seconds until allowed
+            is math.inf when `cost` exceeds a bucket's capacity.
+        """
+        headers = dict(scope["headers"])
+        checks: List[Tuple[str, RateLimitRule]] = [(f"ip:{self._client_ip(scope, headers)}", self.ip_rule)]
+        if b"api-key" in headers:
+            checks.append((f"key:{_hash_key(headers[b'api-key'].decode('latin-1'))}", self.key_rule))
+
+        # Refused before any bucket is touched: waiting would never help
+        for _, rule in checks:
+            if cost > rule.capacity:
+                return False, rule, 0.0, math.inf
+
+        tightest: Optional[Tuple[RateLimitRule, float]] = None
+        for bucket, rule in checks:
+            result = self.backend.take(bucket, rule.capacity, rule.rate, cost)
+            if inspect.isawaitable(result):
+                result = await result
+            allowed, remaining, retry_after = result
+            if not allowed:
+                return False, rule, 0.0, retry_after
+            if tightest is None or remaining < tightest[1]:
+                tightest = (rule, remaining)
+        return True, tightest[0], tightest[1], 0.0
+
+
+class RateLimitMiddleware:
+    """ASGI middleware that enforces a RateLimiter on HTTP requests."""
+
+    def __init__(self, app, limiter: RateLimiter, cost: Optional[Callable[[dict], float]] = None,
+                 exempt_paths: Tuple[str, ...] = ("/metrics",)):
+        """
+        Args:
+            app: Wrapped ASGI app
+            limiter: Buckets to check
+            cost: Function of the ASGI scope returning the tokens a request costs
+            exempt_paths: Paths that are never limited
+        """
+        self.app = app
+        self.limiter = limiter
+        self.cost = cost or (lambda scope: 1.0)
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, rule, remaining, retry_after = await self.limiter.check(scope, self.cost(scope))
+        if not allowed:
+            await self._reject(send, rule, retry_after)
+            return
+
+        limit_headers = _limit_headers(rule, remaining)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + limit_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _reject(self, send, rule: RateLimitRule, retry_after: float) -> None:
+        if math.isinf(retry_after):
+            status, body, retry_headers = 413, b'{"detail":"Request costs more than the rate limit allows."}', []
+        else:
+            status, body = 429, b'{"detail":"Rate limit exceeded. Try again later."}'
+            retry_headers = [(b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1"))]
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ] + retry_headers + _limit_headers(rule, 0),
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,179 @@
+"""
+Redis Helpers for Lab 8
+=======================
+
+This module gives the CLI driver and the tests one Redis connection pool
+per process and helpers that save round trips:
+
+- get_client() returns a client on the shared pool, so connections are
+  reused instead of opened for every command or every test. redis-py
+  resets the pool in a forked child, so test workers get their own.
+- mget_batched() and mset_batched() send many keys in MGET/SET batches
+  through a single pipeline: one round trip instead of one per key.
+- scan_keys() walks the keyspace with SCAN, a few keys (`count`) per call,
+  instead of KEYS, which blocks Redis until it has matched every key.
+- delete_matching() deletes the keys that match a pattern, found with
+  SCAN and removed with UNLINK in batches.
+
+The server comes from REDIS_HOST and REDIS_PORT (localhost:6379 otherwise).
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+import redis
+
+from tracing import TracedClient, traced
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_SCAN_COUNT = 1000
+
+_pools: Dict[bool, redis.ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(decode_responses: bool = True) -> redis.ConnectionPool:
+    """
+    Get the shared connection pool, creating it on first use.
+
+    The settings are read on first use rather than at import, so test.py
+    can point the pool at a stand-in after importing this module.
+
+    Args:
+        decode_responses: Whether replies are decoded to str
+
+    Returns:
+        ConnectionPool shared by every client of this process
+    """
+    with _pools_lock:
+        if decode_responses not in _pools:
+            _pools[decode_responses] = redis.ConnectionPool(
+                host=os.environ.get("REDIS_HOST", "localhost") or "localhost",
+                port=int(os.environ.get("REDIS_PORT", "6379")),
+                decode_responses=decode_responses,
+                max_connections=int(os.environ.get("REDIS_MAX_CONNECTIONS", "50")),
+                socket_connect_timeout=2,
+                health_check_interval=30,
+            )
+        return _pools[decode_responses]
+
+
+def get_client(decode_responses: bool = True):
+    """
+    Get a Redis client on the shared pool.
+
+    Args:
+        decode_responses: Whether replies are decoded to str
+
+    Returns:
+        redis.Redis (wrapped in TracedClient)
+    """
+    return TracedClient(redis.Redis(connection_pool=get_pool(decode_responses)), "redis")
+
+
+def _batches(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@traced("redis.mget_batched", kind="client")
+def mget_batched(client, keys: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE) -> List[Optional[Any]]:
+    """
+    Get many keys in one round trip.
+
+    Args:
+        client: Redis client
+        keys: Keys to get
+        batch_size: Keys per MGET, so no single command is huge
+
+    Returns:
+        Values in the same order as keys (None for missing keys)
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+    pipe = client.pipeline(transaction=False)
+    for batch in _batches(keys, batch_size):
+        pipe.mget(batch)
+    return [value for values in pipe.execute() for value in values]
+
+
+@traced("redis.mset_batched", kind="client")
+def mset_batched(client, mapping: Mapping[str, Any], ttl: Optional[int] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Set many keys in one round trip.
+
+    Args:
+        client: Redis client
+        mapping: Key -> value
+        ttl: Expiry in seconds for every key (no expiry if None)
+        batch_size: Keys per MSET (when there is no ttl)
+
+    Returns:
+        Number of keys set
+    """
+    if not mapping:
+        return 0
+    pipe = client.pipeline(transaction=False)
+    if ttl is None:
+        for batch in _batches(list(mapping.items()), batch_size):
+            pipe.mset(dict(batch))
+    else:
+        # MSET can't set an expiry, so each key gets its own SET in the pipeline
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ttl)
+    pipe.execute()
+    return len(mapping)
+
+
+def scan_keys(client, match: str = "*", count: int = DEFAULT_SCAN_COUNT,
+              key_type: Optional[str] = None) -> Iterator[str]:
+    """
+    Iterate over the keys matching a pattern without blocking Redis.
+
+    SCAN may return a key more than once if the keyspace is resized
+    during the walk; keys added or removed meanwhile may or may not be
+    returned.
+
+    Args:
+        client: Redis client
+        match: Glob-style pattern, e.g. "session:*"
+        count: Keys Redis looks at per SCAN call (a hint)
+        key_type: Only keys of this type, e.g. "hash"
+
+    Returns:
+        Iterator of keys
+    """
+    return client.scan_iter(match=match, count=count, _type=key_type)
+
+
+@traced("redis.delete_matching", kind="client")
+def delete_matching(client, match: str, count: int = DEFAULT_SCAN_COUNT,
+                    batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Delete every key matching a pattern.
+
+    Keys are found with SCAN and removed with UNLINK (freed in the
+    background by Redis), batch_size keys per command.
+
+    Args:
+        client: Redis client
+        match: Glob-style pattern, e.g. "test:abc123:*"
+        count: Keys Redis looks at per SCAN call
+        batch_size: Keys per UNLINK
+
+    Returns:
+        Number of keys deleted
+    """
+    deleted = 0
+    batch: List[str] = []
+    for key in scan_keys(client, match, count):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            deleted += client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += client.unlink(*batch)
+    return deleted
@@ -0,0 +1,246 @@
+"""
+JSON Response Serialization for Lab 8
+=====================================
+
+This module provides pluggable JSON response classes for the FastAPI app.
+The encoder is chosen once at startup (orjson, msgspec or the standard
+library json module) and installed as the app's default response class.
+
+Route results go through FastAPI's jsonable_encoder before they reach the
+response class, so all encoders produce the same JSON for them. Values
+encoded directly with get_dumps() can differ in one way:
+
+- Decimal values (from MySQL) are encoded by stdlib and orjson the way
+  jsonable_encoder does it: whole values as ints, everything else as
+  floats (Decimal("30.00") becomes 30.0). msgspec keeps the Decimal's own
+  digits (30.00). Both parse back to the same number.
+- Integers of any size are encoded exactly. orjson only supports 64-bit
+  integers and Python refuses to convert ints with more than
+  sys.get_int_max_str_digits() digits to text, so payloads that hit either
+  limit (e.g. /factorial/5000) fall back to a slower encoder that converts
+  huge ints in chunks. That limit guards against int-to-text conversions
+  whose time grows quadratically with the number of digits; the fallback
+  skips it, so callers must bound the size of the ints they encode (main.py
+  refuses results over MAX_RESULT_DIGITS).
+"""
+
+import datetime
+import json
+import os
+import sys
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Type
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(obj: Any) -> Any:
+    """Encode types the JSON libraries do not handle natively."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8', errors='replace')
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _int_to_str(value: int) -> str:
+    """
+    Convert an int to decimal text regardless of the interpreter's digit limit.
+
+    Values over the limit are split with divmod into halves that each fit,
+    which keeps the conversion roughly as fast as str() itself.
+    """
+    limit = sys.get_int_max_str_digits() if hasattr(sys, 'get_int_max_str_digits') else 0
+    if limit == 0 or value.bit_length() < limit * 3:
+        # bit_length * log10(2) < limit, so str() is always allowed here
+        return str(value)
+    if value < 0:
+        return "-" + _int_to_str(-value)
+    digits = int(value.bit_length() * 0.30103) + 1
+    half = digits // 2
+    high, low = divmod(value, 10 ** half)
+    if high == 0:
+        return _int_to_str(low)
+    return _int_to_str(high) + _int_to_str(low).zfill(half)
+
+
+def _encode_value(value: Any, parts: list) -> None:
+    """Append the JSON text for `value` to `parts` (used by the fallback encoder)."""
+    if value is None or isinstance(value, (bool, str, float)):
+        parts.append(json.dumps(value, ensure_ascii=False, allow_nan=False))
+    elif isinstance(value, int):
+        parts.append(_int_to_str(value))
+    elif isinstance(value, dict):
+        parts.append("{")
+        for i, (key, item) in enumerate(value.items()):
+            if i:
+                parts.append(",")
+            parts.append(json.dumps(str(key), ensure_ascii=False))
+            parts.append(":")
+            _encode_value(item, parts)
+        parts.append("}")
+    elif isinstance(value, list):
+        parts.append("[")
+        for i, item in enumerate(value):
+            if i:
+                parts.append(",")
+            _encode_value(item, parts)
+        parts.append("]")
+    else:
+        _encode_value(_default(value), parts)
+
+
+def bigint_safe_dumps(content: Any) -> bytes:
+    """
+    Pure Python JSON encoder that handles integers of any size.
+
+    Args:
+        content: JSON-compatible Python value
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    parts = []
+    _encode_value(content, parts)
+    return "".join(parts).encode("utf-8")
+
+
+def stdlib_dumps(content: Any) -> bytes:
+    """Encode with the standard library json module (same options as JSONResponse)."""
+    try:
+        return json.dumps(
+            content,
+            default=_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+    except ValueError:
+        # Integer too long for str(); NaN/inf are re-raised by the fallback
+        return bigint_safe_dumps(content)
+
+
+def orjson_dumps(content: Any) -> bytes:
+    """Encode with orjson, falling back for integers outside the 64-bit range."""
+    try:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # orjson.JSONEncodeError is a TypeError subclass
+        return stdlib_dumps(content)
+
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=_default, decimal_format="number")
+else:
+    _msgspec_encoder = None
+
+
+def msgspec_dumps(content: Any) -> bytes:
+    """Encode with msgspec, falling back for integers over the digit limit."""
+    try:
+        return _msgspec_encoder.encode(content)
+    except (TypeError, ValueError):
+        return stdlib_dumps(content)
+
+
+class StdlibJSONResponse(JSONResponse):
+    """JSON response rendered with the standard library json module."""
+
+    def render(self, content: Any) -> bytes:
+        return stdlib_dumps(content)
+
+
+class OrjsonJSONResponse(JSONResponse):
+    """JSON response rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson_dumps(content)
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """JSON response rendered with msgspec."""
+
+    def render(self, content: Any) -> bytes:
+        return msgspec_dumps(content)
+
+
+SERIALIZERS: Dict[str, Callable[[Any], bytes]] = {
+    "stdlib": stdlib_dumps,
+    "orjson": orjson_dumps,
+    "msgspec": msgspec_dumps,
+}
+
+RESPONSE_CLASSES: Dict[str, Type[JSONResponse]] = {
+    "stdlib": StdlibJSONResponse,
+    "orjson": OrjsonJSONResponse,
+    "msgspec": MsgspecJSONResponse,
+}
+
+
+def available_serializers() -> Dict[str, Callable[[Any], bytes]]:
+    """
+    Get the serializers whose libraries are installed.
+
+    Returns:
+        Dictionary mapping serializer names to their dumps functions
+    """
+    installed = {"stdlib": True, "orjson": orjson is not None, "msgspec": msgspec is not None}
+    return {name: func for name, func in SERIALIZERS.items() if installed[name]}
+
+
+def _choose_serializer(name: Optional[str] = None) -> str:
+    available = available_serializers()
+    name = name or os.environ.get("JSON_SERIALIZER")
+    if name is None:
+        # msgspec was the fastest overall in bench_serialization.py
+        name = "msgspec" if "msgspec" in available else "orjson" if "orjson" in available else "stdlib"
+    if name not in available:
+        print(f"JSON serializer '{name}' is not available. Using stdlib json.")
+        name = "stdlib"
+    return name
+
+
+def get_response_class(name: Optional[str] = None) -> Type[JSONResponse]:
+    """
+    Pick the JSON response class for the app.
+
+    Args:
+        name: "orjson", "msgspec" or "stdlib". Defaults to the JSON_SERIALIZER
+              environment variable, or the fastest installed library.
+
+    Returns:
+        Response class to use as the app's default_response_class
+    """
+    return RESPONSE_CLASSES[_choose_serializer(name)]
+
+
+def get_dumps(name: Optional[str] = None) -> Callable[[Any], bytes]:
+    """
+    Pick the JSON encoder function, chosen the same way as get_response_class().
+
+    Used where responses are encoded by hand, e.g. NDJSON streams.
+
+    Args:
+        name: "orjson", "msgspec" or "stdlib" (optional)
+
+    Returns:
+        Function encoding a value to JSON bytes
+    """
+    return SERIALIZERS[_choose_serializer(name)]
@@ -0,0 +1,213 @@
+"""
+Server-Side Sessions for Lab 8
+==============================
+
+This module keeps per-visitor session data on the server, so every
+uvicorn worker and container sees the same session without sticky
+routing.
+
+- The browser only holds a session cookie: a random session id followed
+  by an HMAC-SHA256 signature ("<id>.<signature>"). Cookies with a bad
+  signature are ignored without a backend lookup, so forged or guessed
+  ids never reach Redis.
+- Session data is a small JSON object. RedisSessionBackend stores it
+  under "session:<id>" with a sliding TTL: every read extends the
+  expiry with a single GETEX, so active sessions never expire and idle
+  ones clean themselves up.
+- InMemorySessionBackend keeps sessions in the process. It is used when
+  REDIS_HOST is not set, and RedisSessionBackend falls back to it while
+  Redis is unreachable.
+
+The signing secret comes from SESSION_SECRET and must be the same on
+every instance.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+import redis.asyncio
+
+SESSION_COOKIE = "session"
+
+
+def _signature(secret: bytes, session_id: str) -> str:
+    digest = hmac.new(secret, session_id.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def sign_session_id(secret: bytes, session_id: str) -> str:
+    """
+    Build the cookie value for a session id.
+
+    Args:
+        secret: Signing key
+        session_id: Random session id
+
+    Returns:
+        "<session id>.<signature>"
+    """
+    return f"{session_id}.{_signature(secret, session_id)}"
+
+
+def unsign_session_id(secret: bytes, cookie: Optional[str]) -> Optional[str]:
+    """
+    Check a session cookie and extract the session id.
+
+    Args:
+        secret: Signing key
+        cookie: Cookie value (may be None)
+
+    Returns:
+        Session id, or None if the cookie is missing, malformed or its signature is wrong
+    """
+    # Signed ids are ASCII, and anything else can't be hashed or compared
+    if not cookie or "." not in cookie or not cookie.isascii():
+        return None
+    session_id, signature = cookie.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _signature(secret, session_id)):
+        return None
+    return session_id
+
+
+class InMemorySessionBackend:
+    """Sessions stored in a dictionary, with the same sliding TTL as Redis."""
+
+    def __init__(self, max_sessions: int = 100000):
+        self._sessions: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.max_sessions = max_sessions
+
+    async def load(self, session_id: str, ttl: int) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[1] < now:
+                self._sessions.pop(session_id, None)
+                return None
+            self._sessions[session_id] = (entry[0], now + ttl)
+            return entry[0]
+
+    async def save(self, session_id: str, data: str, ttl: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (data, now + ttl)
+            if len(self._sessions) > self.max_sessions:
+                for expired in [k for k, (_, expires) in self._sessions.items() if expires < now]:
+                    del self._sessions[expired]
+
+    async def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class RedisSessionBackend:
+    """Sessions stored as Redis strings, falling back to memory when Redis is down."""
+
+    def __init__(self, client: redis.asyncio.Redis, prefix: str = "session:",
+                 fallback: Optional[InMemorySessionBackend] = None, retry_interval: float = 5.0):
+        """
+        Args:
+            client: asyncio Redis client
+            prefix: Key prefix for sessions
+            fallback: Backend used while Redis is unreachable
+            retry_interval: Seconds to wait before trying Redis again after a failure
+        """
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or InMemorySessionBackend()
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _mark_down(self, err: Exception) -> None:
+        print(f"Session store: Redis unavailable ({err}); using in-memory sessions")
+        self._down_until = time.monotonic() + self.retry_interval
+
+    async def load(self, session_id: str, ttl: int) -> Optional[str]:
+        if self._available():
+            try:
+                # GETEX reads the session and slides its expiry in one round trip
+                data = await self.client.getex(self.prefix + session_id, ex=ttl)
+                return data.decode("utf-8") if isinstance(data, bytes) else data
+            except redis.RedisError as err:
+                self._mark_down(err)
+        return await self.fallback.load(session_id, ttl)
+
+    async def save(self, session_id: str, data: str, ttl: int) -> None:
+        if self._available():
+            try:
+                await self.client.set(self.prefix + session_id, data, ex=ttl)
+                return
+            except redis.RedisError as err:
+                self._mark_down(err)
+        await self.fallback.save(session_id, data, ttl)
+
+    async def delete(self, session_id: str) -> None:
+        if self._available():
+            try:
+                await self.client.delete(self.prefix + session_id)
+            except redis.RedisError as err:
+                self._mark_down(err)
+        await self.fallback.delete(session_id)
+
+
+class SessionStore:
+    """Creates, loads and saves sessions identified by signed cookies."""
+
+    def __init__(self, backend, secret: str, ttl: int = 1800):
+        """
+        Args:
+            backend: InMemorySessionBackend or RedisSessionBackend
+            secret: Cookie signing key, shared by every instance
+            ttl: Seconds of inactivity before a session expires
+        """
+        self.backend = backend
+        self.secret = secret.encode("utf-8")
+        self.ttl = ttl
+
+    async def load(self, cookie: Optional[str]) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Load the session named by a cookie, extending its TTL.
+
+        Args:
+            cookie: Session cookie value (may be None)
+
+        Returns:
+            Tuple of (session id or None, session data). The data is empty
+            for a missing, forged or expired session.
+        """
+        session_id = unsign_session_id(self.secret, cookie)
+        if session_id is None:
+            return None, {}
+        data = await self.backend.load(session_id, self.ttl)
+        if data is None:
+            return None, {}
+        return session_id, json.loads(data)
+
+    async def save(self, session_id: Optional[str], data: Dict[str, Any]) -> str:
+        """
+        Save session data, creating a new session when session_id is None.
+
+        Args:
+            session_id: Existing session id, or None
+            data: JSON-serializable session data
+
+        Returns:
+            Cookie value to send back to the client
+        """
+        session_id = session_id or secrets.token_urlsafe(24)
+        await self.backend.save(session_id, json.dumps(data, separators=(",", ":")), self.ttl)
+        return sign_session_id(self.secret, session_id)
+
+    async def delete(self, session_id: Optional[str]) -> None:
+        if session_id is not None:
+            await self.backend.delete(session_id)
@@ -0,0 +1,332 @@
+"""
+Report Snapshots for Lab 8
+==========================
+
+This module runs report queries from database_utils.QUERIES and publishes
+their results to MinIO, so dashboards can read precomputed snapshots
+instead of querying MySQL on every view:
+
+- Each report is streamed from MySQL (open_query_stream) and written as
+  gzip-compressed CSV, or as Parquet when pyarrow is installed, to a
+  temporary file that spills to disk once it is large.
+- Every run uploads to its own folder, "<prefix><run id>/", plus a
+  manifest.json listing each report's object, row count, columns, size
+  and SHA-256.
+- "<prefix>latest.json" is a copy of the newest manifest. It is uploaded
+  last, so a reader never sees a manifest whose files aren't there yet,
+  and a run that fails half way doesn't replace the previous snapshot.
+
+Usage: python snapshots.py [report keys...] [--format csv.gz|parquet]
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from tempfile import SpooledTemporaryFile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from minio.error import S3Error
+
+from database_utils import (QUERIES, close_connection, connect_to_db, get_query_by_key, iter_rows_as_csv,
+                            open_query_stream)
+from storage import CHUNK_SIZE, ensure_bucket, iter_object, read_object, upload_buffer, upload_stream
+from tracing import traced
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_BUCKET = os.environ.get("SNAPSHOT_BUCKET", "lab8-bucket")
+DEFAULT_PREFIX = "snapshots/"
+# Snapshots bigger than this are spooled to disk while they are written
+SPOOL_SIZE = 8 * 1024 * 1024
+PARQUET_BATCH_ROWS = 10000
+
+FORMATS = {
+    "csv.gz": {"content_type": "text/csv", "content_encoding": "gzip"},
+    "parquet": {"content_type": "application/vnd.apache.parquet", "content_encoding": None},
+}
+
+
+def available_formats() -> List[str]:
+    """Get the snapshot formats that can be written here."""
+    return [fmt for fmt in FORMATS if fmt != "parquet" or pyarrow is not None]
+
+
+class _HashingWriter(io.RawIOBase):
+    """File wrapper that counts and hashes everything written to it."""
+
+    def __init__(self, target):
+        self.target = target
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        self.target.write(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+
+def write_csv_gz(headers: List[str], rows: Iterator[Tuple], out) -> int:
+    """
+    Write rows as gzip-compressed CSV with a header line.
+
+    Args:
+        headers: Column names
+        rows: Row iterator
+        out: Binary file to write to
+
+    Returns:
+        Number of rows written
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    # mtime=0 so the same data always gives the same bytes (and SHA-256)
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6, mtime=0) as gz:
+        for chunk in iter_rows_as_csv(headers, counted(), rows_per_chunk=1000):
+            gz.write(chunk.encode("utf-8"))
+    return count
+
+
+def write_parquet(headers: List[str], rows: Iterator[Tuple], out) -> int:
+    """
+    Write rows as a Parquet file, one row group per PARQUET_BATCH_ROWS rows.
+
+    The column types are taken from the first batch of rows.
+
+    Args:
+        headers: Column names
+        rows: Row iterator
+        out: Binary file to write to
+
+    Returns:
+        Number of rows written
+    """
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is not installed")
+    count = 0
+    writer = None
+    schema = None
+    batch: List[Tuple] = []
+
+    def flush():
+        nonlocal writer, schema
+        columns = [list(column) for column in zip(*batch)] if batch else [[] for _ in headers]
+        table = pyarrow.table(dict(zip(headers, columns)), schema=schema)
+        if writer is None:
+            schema = table.schema
+            writer = pyarrow.parquet.ParquetWriter(out, schema, compression="zstd")
+        writer.write_table(table)
+
+    try:
+        for row in rows:
+            batch.append(row)
+            count += 1
+            if len(batch) >= PARQUET_BATCH_ROWS:
+                flush()
+                batch = []
+        if batch or writer is None:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+WRITERS = {"csv.gz": write_csv_gz, "parquet": write_parquet}
+
+
+def _run_id() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+@traced("snapshots.publish", kind="client")
+def publish_snapshots(keys: Optional[List[str]] = None, fmt: str = "csv.gz", bucket_name: str = DEFAULT_BUCKET,
+                      prefix: str = DEFAULT_PREFIX, mydb=None, client=None) -> Optional[Dict]:
+    """
+    Run reports and upload their results, with a manifest, to MinIO.
+
+    Args:
+        keys: Report keys from QUERIES (all of them if None)
+        fmt: "csv.gz" or "parquet"
+        bucket_name: Target bucket
+        prefix: Object name prefix of the snapshots
+        mydb: MySQL connection (a new one is opened and closed if None)
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        The manifest, or None if the database isn't available
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"format must be one of {', '.join(available_formats())}")
+    unknown = [key for key in keys or [] if get_query_by_key(key) is None]
+    if unknown:
+        raise ValueError(f"unknown reports: {', '.join(unknown)}")
+    keys = list(keys) if keys else list(QUERIES)
+
+    own_connection = mydb is None
+    if own_connection:
+        mydb = connect_to_db()
+        if mydb is None:
+            return None
+
+    run_id = _run_id()
+    run_prefix = f"{prefix}{run_id}/"
+    ensure_bucket(bucket_name, client)
+    manifest = {"run_id": run_id, "generated_at": datetime.now(timezone.utc).isoformat(),
+                "format": fmt, **FORMATS[fmt], "reports": {}}
+    try:
+        for key in keys:
+            manifest["reports"][key] = _publish_report(mydb, key, fmt, bucket_name, run_prefix, client)
+    finally:
+        if own_connection:
+            close_connection(mydb)
+
+    body = json.dumps(manifest, indent=1).encode("utf-8")
+    upload_buffer(bucket_name, f"{run_prefix}manifest.json", body, content_type="application/json", client=client)
+    # Last, so readers only ever find complete runs
+    upload_buffer(bucket_name, f"{prefix}latest.json", body, content_type="application/json", client=client)
+    return manifest
+
+
+def _publish_report(mydb, key: str, fmt: str, bucket_name: str, run_prefix: str, client) -> Dict:
+    query_info = get_query_by_key(key)
+    stream = open_query_stream(mydb, query_info["query"])
+    if stream is None:
+        raise RuntimeError(f"report {key} failed")
+    headers, rows = stream
+    object_name = f"{run_prefix}{key}.{fmt}"
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        out = _HashingWriter(spool)
+        try:
+            count = WRITERS[fmt](headers, rows, out)
+        finally:
+            rows.close()
+        spool.seek(0)
+        upload_stream(bucket_name, object_name, spool, out.size, content_type=FORMATS[fmt]["content_type"],
+                      client=client)
+    return {"name": query_info["name"], "object": object_name, "rows": count, "columns": headers,
+            "bytes": out.size, "sha256": out.sha256.hexdigest()}
+
+
+def latest_manifest(bucket_name: str = DEFAULT_BUCKET, prefix: str = DEFAULT_PREFIX,
+                    client=None) -> Optional[Dict]:
+    """
+    Read the manifest of the newest snapshot run.
+
+    Returns:
+        The manifest, or None if no snapshot has been published
+    """
+    try:
+        body = read_object(bucket_name, f"{prefix}latest.json", client=client)
+    except S3Error as e:
+        if e.code == "NoSuchBucket":
+            return None
+        raise
+    return json.loads(body) if body is not None else None
+
+
+def iter_snapshot(manifest: Dict, key: str, bucket_name: str = DEFAULT_BUCKET,
+                  chunk_size: int = CHUNK_SIZE, client=None) -> Iterator[bytes]:
+    """
+    Stream the stored bytes of one report, still compressed.
+
+    The object is opened before this returns.
+
+    Raises:
+        KeyError: If the report isn't in the manifest
+        S3Error: If the snapshot object is missing
+    """
+    return iter_object(bucket_name, manifest["reports"][key]["object"], chunk_size, client=client)
+
+
+def iter_gunzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Decompress a stream of gzip chunks, one chunk at a time."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class _ChunkReader(io.RawIOBase):
+    """Readable stream over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            self._pending = next(self._chunks, b"")
+            if not self._pending:
+                return 0
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+
+def read_snapshot_rows(manifest: Dict, key: str, bucket_name: str = DEFAULT_BUCKET,
+                       client=None) -> Iterator[Dict[str, str]]:
+    """
+    Read the rows of a gzip CSV snapshot as dictionaries.
+
+    Values come back as strings, as in any CSV file.
+
+    Raises:
+        KeyError: If the report isn't in the manifest
+    """
+    if manifest["format"] != "csv.gz":
+        raise ValueError("read_snapshot_rows only reads csv.gz snapshots")
+    raw = io.BufferedReader(_ChunkReader(iter_snapshot(manifest, key, bucket_name, client=client)))
+    with io.TextIOWrapper(gzip.GzipFile(fileobj=raw), encoding="utf-8", newline="") as text:
+        yield from csv.DictReader(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish report snapshots to MinIO")
+    parser.add_argument("keys", nargs="*", help="Report keys (all reports if none)")
+    parser.add_argument("--format", default="csv.gz", choices=available_formats())
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET)
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX)
+    args = parser.parse_args()
+
+    manifest = publish_snapshots(args.keys or None, args.format, args.bucket, args.prefix)
+    if manifest is None:
+        print("ERROR: Database is not available")
+        raise SystemExit(1)
+    print(f"Published snapshot {manifest['run_id']} to {args.bucket}/{args.prefix}")
+    for key, report in manifest["reports"].items():
+        print(f"  {key:<10}{report['rows']:>8} rows {report['bytes']:>10} bytes  {report['object']}")
+
+
+if __name__ == "__main__":
+    main()
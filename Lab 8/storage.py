@@ -0,0 +1,512 @@
+"""
+Object Storage for Lab 8
+========================
+
+This module gives the lab one shared MinIO client and helpers for moving
+large objects efficiently:
+
+- get_client() creates the Minio client once per process, with an HTTP
+  connection pool big enough for parallel transfers. The client is thread
+  safe, so it is reused for every call instead of being created each time.
+- upload_file() and upload_stream() stream the data as a multipart upload.
+  The data is read one part at a time (MINIO_PART_SIZE), and up to
+  MINIO_TRANSFER_WORKERS parts are uploaded in parallel. Memory use is
+  about (workers + 1) * part_size, whatever the object size.
+- download_file() writes an object to disk in chunks. Large objects are
+  split into byte ranges that are downloaded in parallel, each straight
+  into its place in the file. The file only appears once it is complete.
+- iter_object() streams an object in chunks instead of reading it into
+  memory with response.read(). The object is opened before it returns,
+  so a missing object or an unreachable server raises to the caller
+  rather than part way through a response.
+- upload_buffer() uploads bytes, a memoryview or an mmap without wrapping
+  them in a BytesIO copy; upload_mapped() does the same for a file mapped
+  with mmap. Only the part being uploaded is copied, and mapped pages are
+  released as soon as they are sent, so the process RSS doesn't grow with
+  the file size.
+- download_into() fills a pre-allocated buffer (a bytearray or a writable
+  mmap) instead of building the object up from chunks. download_mapped()
+  reads an object straight into a mapped file, releasing pages as they
+  are written.
+
+The endpoint and credentials come from MINIO_ENDPOINT, MINIO_ACCESS_KEY,
+MINIO_SECRET_KEY and MINIO_SECURE (the docker-compose defaults otherwise).
+"""
+
+import contextlib
+import io
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import urllib3
+from minio import Minio
+from minio.error import S3Error
+
+from tracing import TracedClient, traced
+
+# S3 requires multipart parts of at least 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = int(os.environ.get("MINIO_PART_SIZE", str(16 * 1024 * 1024)))
+DEFAULT_WORKERS = int(os.environ.get("MINIO_TRANSFER_WORKERS", "4"))
+CHUNK_SIZE = 1024 * 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Get the shared MinIO client, creating it on first use.
+
+    The settings are read on first use rather than at import, so test.py
+    can point the client at a stand-in after importing this module.
+
+    Returns:
+        Minio client (wrapped in TracedClient), shared by every thread
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            http_client = urllib3.PoolManager(
+                # One connection per parallel part, plus one for the caller
+                maxsize=max(10, DEFAULT_WORKERS + 1),
+                timeout=urllib3.Timeout(connect=10, read=300),
+                retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+            )
+            _client = TracedClient(Minio(
+                os.environ.get("MINIO_ENDPOINT", "localhost:9000"),
+                access_key=os.environ.get("MINIO_ACCESS_KEY", "minioadmin"),
+                secret_key=os.environ.get("MINIO_SECRET_KEY", "minioadmin123"),
+                secure=os.environ.get("MINIO_SECURE", "false").lower() == "true",
+                http_client=http_client,
+            ), "minio")
+        return _client
+
+
+def ensure_bucket(bucket_name: str, client=None) -> bool:
+    """
+    Create a bucket if it doesn't exist yet.
+
+    Args:
+        bucket_name: Bucket to create
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        True if the bucket was created by this call
+    """
+    client = client or get_client()
+    if client.bucket_exists(bucket_name):
+        return False
+    try:
+        client.make_bucket(bucket_name)
+        return True
+    except S3Error as e:
+        # Another process may have created it first
+        if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+            raise
+        return False
+
+
+def _check_part_size(part_size: int) -> None:
+    if part_size < MIN_PART_SIZE:
+        raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+
+
+@traced("storage.upload_stream", kind="client")
+def upload_stream(bucket_name: str, object_name: str, stream: BinaryIO, length: int = -1,
+                  content_type: str = "application/octet-stream", part_size: int = DEFAULT_PART_SIZE,
+                  workers: int = DEFAULT_WORKERS, client=None):
+    """
+    Upload a stream as a multipart upload, without reading it all into memory.
+
+    Args:
+        bucket_name: Target bucket
+        object_name: Target object name
+        stream: Readable binary stream
+        length: Stream size in bytes, or -1 if unknown
+        content_type: Object content type
+        part_size: Bytes per part (at least 5 MiB)
+        workers: Parts uploaded in parallel
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        minio ObjectWriteResult
+    """
+    _check_part_size(part_size)
+    client = client or get_client()
+    # Minio reads one part at a time and blocks while `workers` parts
+    # are in flight, so memory stays bounded
+    return client.put_object(bucket_name, object_name, stream, length, content_type=content_type,
+                             part_size=part_size, num_parallel_uploads=workers)
+
+
+@traced("storage.upload_file", kind="client")
+def upload_file(bucket_name: str, object_name: str, path: str,
+                content_type: str = "application/octet-stream", part_size: int = DEFAULT_PART_SIZE,
+                workers: int = DEFAULT_WORKERS, client=None):
+    """
+    Upload a file from disk as a multipart upload.
+
+    Args:
+        bucket_name: Target bucket
+        object_name: Target object name
+        path: File to upload
+        content_type: Object content type
+        part_size: Bytes per part (at least 5 MiB)
+        workers: Parts uploaded in parallel
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        minio ObjectWriteResult
+    """
+    with open(path, "rb") as f:
+        return upload_stream(bucket_name, object_name, f, os.fstat(f.fileno()).st_size,
+                             content_type, part_size, workers, client)
+
+
+@contextlib.contextmanager
+def map_file(path: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    """
+    Map a file into memory read-only.
+
+    Args:
+        path: File to map
+
+    Returns:
+        Context manager giving the mmap (or b"" for an empty file, which
+        can't be mapped)
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapping
+        finally:
+            mapping.close()
+
+
+def _release_pages(buffer, start: int, end: int) -> int:
+    """
+    Drop the mapped pages of buffer[start:end] from the process RSS.
+
+    They stay in the page cache and are mapped again if read. Returns the
+    offset up to which pages were released.
+    """
+    if not isinstance(buffer, mmap.mmap) or not hasattr(mmap, "MADV_DONTNEED"):
+        return start
+    start -= start % mmap.PAGESIZE
+    end -= end % mmap.PAGESIZE
+    if end > start:
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+    return max(start, end)
+
+
+def iter_mapped(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    """
+    Read a file through mmap, in chunks that aren't copied.
+
+    Each chunk is a memoryview of the mapping and is only valid until the
+    next one is requested.
+
+    Args:
+        path: File to read
+        chunk_size: Bytes per chunk
+
+    Returns:
+        Iterator of memoryviews
+    """
+    with map_file(path) as mapping:
+        released = 0
+        with memoryview(mapping) as view:
+            for offset in range(0, len(view), chunk_size):
+                end = min(offset + chunk_size, len(view))
+                with view[offset:end] as chunk:
+                    yield chunk
+                released = _release_pages(mapping, released, end)
+
+
+class _BufferReader(io.RawIOBase):
+    """Readable stream over a bytes-like object or mmap, without copying it up front."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._view = memoryview(buffer).cast("B")
+        self.length = len(self._view)
+        self._pos = 0
+        self._released = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.length if size is None or size < 0 else min(self.length, self._pos + size)
+        # Minio needs bytes, so this part (and only this part) is copied
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        self._released = _release_pages(self._buffer, self._released, end)
+        return data
+
+    def close(self) -> None:
+        # An mmap can't be closed while a memoryview of it exists
+        self._view.release()
+        super().close()
+
+
+@traced("storage.upload_buffer", kind="client")
+def upload_buffer(bucket_name: str, object_name: str, buffer,
+                  content_type: str = "application/octet-stream", part_size: int = DEFAULT_PART_SIZE,
+                  workers: int = DEFAULT_WORKERS, client=None):
+    """
+    Upload bytes, a bytearray, a memoryview or an mmap without copying it
+    into a BytesIO first.
+
+    Args:
+        bucket_name: Target bucket
+        object_name: Target object name
+        buffer: Content
+        content_type: Object content type
+        part_size: Bytes per part (at least 5 MiB)
+        workers: Parts uploaded in parallel
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        minio ObjectWriteResult
+    """
+    with _BufferReader(buffer) as reader:
+        return upload_stream(bucket_name, object_name, reader, reader.length, content_type,
+                             part_size, workers, client)
+
+
+def upload_mapped(bucket_name: str, object_name: str, path: str,
+                  content_type: str = "application/octet-stream", part_size: int = DEFAULT_PART_SIZE,
+                  workers: int = DEFAULT_WORKERS, client=None):
+    """
+    Upload a file from disk through mmap.
+
+    The parts are copied straight from the page cache, and each part's
+    pages are released once it has been read.
+
+    Args:
+        bucket_name: Target bucket
+        object_name: Target object name
+        path: File to upload
+        content_type: Object content type
+        part_size: Bytes per part (at least 5 MiB)
+        workers: Parts uploaded in parallel
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        minio ObjectWriteResult
+    """
+    with map_file(path) as mapping:
+        return upload_buffer(bucket_name, object_name, mapping, content_type, part_size, workers, client)
+
+
+def iter_object(bucket_name: str, object_name: str, chunk_size: int = CHUNK_SIZE,
+                offset: int = 0, length: int = 0, client=None) -> Iterator[bytes]:
+    """
+    Stream an object (or a byte range of it) in chunks.
+
+    Args:
+        bucket_name: Source bucket
+        object_name: Source object name
+        chunk_size: Bytes per yielded chunk
+        offset: First byte to read
+        length: Bytes to read (0 reads to the end)
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        Iterator of chunks; iterate it to the end or close() it, so the
+        connection goes back to the pool
+
+    Raises:
+        S3Error: If the object doesn't exist
+    """
+    client = client or get_client()
+    response = client.get_object(bucket_name, object_name, offset=offset, length=length)
+
+    def chunks() -> Iterator[bytes]:
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    return chunks()
+
+
+def _ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    return [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+
+
+def _download_range(bucket_name: str, object_name: str, path: str, offset: int, length: int,
+                    chunk_size: int, client) -> None:
+    # Each range has its own file handle, so no seek is shared between threads
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        for chunk in iter_object(bucket_name, object_name, chunk_size, offset, length, client):
+            f.write(chunk)
+
+
+@traced("storage.download_file", kind="client")
+def download_file(bucket_name: str, object_name: str, path: str, part_size: int = DEFAULT_PART_SIZE,
+                  workers: int = DEFAULT_WORKERS, chunk_size: int = CHUNK_SIZE, client=None) -> int:
+    """
+    Download an object to a file, in parallel byte ranges for large objects.
+
+    The data goes to "<path>.part" first and is renamed when complete, so
+    a failed download never leaves a truncated file at `path`.
+
+    Args:
+        bucket_name: Source bucket
+        object_name: Source object name
+        path: File to write
+        part_size: Bytes per range
+        workers: Ranges downloaded in parallel
+        chunk_size: Bytes per read from each response
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        Number of bytes written
+    """
+    client = client or get_client()
+    size = client.stat_object(bucket_name, object_name).size
+    tmp_path = f"{path}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        ranges = _ranges(size, part_size)
+        if workers <= 1 or len(ranges) <= 1:
+            _download_range(bucket_name, object_name, tmp_path, 0, 0, chunk_size, client)
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+                futures = [executor.submit(_download_range, bucket_name, object_name, tmp_path,
+                                           offset, length, chunk_size, client)
+                           for offset, length in ranges]
+                for future in futures:
+                    future.result()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
+
+
+def _read_into(response, view: memoryview, chunk_size: int, mapping=None) -> int:
+    """Fill view from a response; pages of `mapping` already written are released."""
+    filled = released = 0
+    while filled < len(view):
+        count = response.readinto(view[filled:filled + chunk_size])
+        if not count:
+            break
+        filled += count
+        if mapping is not None:
+            released = _release_pages(mapping, released, filled)
+    return filled
+
+
+@traced("storage.download_into", kind="client")
+def download_into(bucket_name: str, object_name: str, buffer, offset: int = 0,
+                  chunk_size: int = CHUNK_SIZE, client=None) -> int:
+    """
+    Download an object (or the part of it that fits) into a pre-allocated buffer.
+
+    Args:
+        bucket_name: Source bucket
+        object_name: Source object name
+        buffer: Writable buffer, e.g. a bytearray or a writable mmap
+        offset: First byte of the object to read
+        chunk_size: Bytes per read from the response
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        Number of bytes written to the buffer
+    """
+    client = client or get_client()
+    with memoryview(buffer).cast("B") as view:
+        if not len(view):
+            return 0
+        response = client.get_object(bucket_name, object_name, offset=offset, length=len(view))
+        try:
+            return _read_into(response, view, chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+
+@traced("storage.download_mapped", kind="client")
+def download_mapped(bucket_name: str, object_name: str, path: str, chunk_size: int = CHUNK_SIZE,
+                    client=None) -> int:
+    """
+    Download an object into a file mapped with mmap.
+
+    The file is created at its final size and the response is read
+    straight into the mapping. Pages already written are released, so the
+    process RSS doesn't grow with the object size. As with download_file(),
+    the data goes to "<path>.part" first.
+
+    Args:
+        bucket_name: Source bucket
+        object_name: Source object name
+        path: File to write
+        chunk_size: Bytes per read from the response
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        Number of bytes written
+    """
+    client = client or get_client()
+    size = client.stat_object(bucket_name, object_name).size
+    tmp_path = f"{path}.part"
+    try:
+        with open(tmp_path, "w+b") as f:
+            f.truncate(size)
+            if size:
+                # A shared mapping: released pages are kept in the page cache
+                # and written to the file
+                mapping = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_WRITE)
+                try:
+                    response = client.get_object(bucket_name, object_name)
+                    try:
+                        with memoryview(mapping) as view:
+                            filled = _read_into(response, view, chunk_size, mapping)
+                    finally:
+                        response.close()
+                        response.release_conn()
+                    if filled != size:
+                        raise IOError(f"expected {size} bytes, got {filled}")
+                    mapping.flush()
+                finally:
+                    mapping.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
+
+
+def read_object(bucket_name: str, object_name: str, client=None) -> Optional[bytes]:
+    """
+    Read a small object into memory.
+
+    Args:
+        bucket_name: Source bucket
+        object_name: Source object name
+        client: Minio client (defaults to the shared one)
+
+    Returns:
+        Object content, or None if the object doesn't exist
+    """
+    try:
+        return b"".join(iter_object(bucket_name, object_name, client=client))
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            return None
+        raise
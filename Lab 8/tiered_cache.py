@@ -0,0 +1,299 @@
+"""
+Two-Tier Cache for Lab 8
+========================
+
+This module puts a small in-process LRU cache in front of Redis, so a hot
+value costs neither a database query nor a Redis round trip:
+
+- Tier 1 is an LRU dictionary in each process, bounded by `max_entries`.
+  Entries also expire after `local_ttl` seconds, which bounds how stale
+  a tier-1 entry can get if an invalidation message is lost.
+- Tier 2 is Redis, shared by every process (e.g. every uvicorn worker).
+  Values are stored as JSON under "cache:<namespace>:<key>" for `ttl`
+  seconds.
+- A miss in both tiers calls the loader and stores its result in both.
+  None is never cached.
+- set(), delete() and clear() publish the key on the
+  "cache:<namespace>:invalidate" channel. Every other process drops it
+  from tier 1 straight away; the next lookup reads the new value from
+  Redis. A tier-1 fill that raced with an invalidation is discarded.
+- Without Redis (client None), or while Redis is down, only tier 1 is used.
+  clear() is the exception: it raises Redis errors, so the caller knows
+  the other processes were not cleared.
+
+Lookups are recorded per tier, both in stats() and in the metrics registry:
+
+- cache_requests_total   counter  cache, tier ("local" or "redis"), result ("hit" or "miss")
+- cache_local_entries    gauge    cache
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+
+from metrics import REGISTRY, Counter, Gauge
+from redis_utils import delete_matching
+
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "cache_requests_total", "Two-tier cache lookups by tier and result.", ("cache", "tier", "result")))
+LOCAL_ENTRIES = REGISTRY.register(Gauge(
+    "cache_local_entries", "Entries in the in-process tier.", ("cache",)))
+
+_MISSING = object()
+
+
+def _ratio(hits: int, misses: int) -> Optional[float]:
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+class TieredCache:
+    """In-process LRU in front of Redis, kept coherent with pub/sub."""
+
+    def __init__(self, namespace: str, client: Optional[redis.Redis] = None, max_entries: int = 1024,
+                 local_ttl: float = 30.0, ttl: float = 300.0):
+        """
+        Args:
+            namespace: Name of the cache, used in Redis keys and metrics
+            client: Redis client for tier 2, or None for tier 1 only
+            max_entries: Entries kept in tier 1
+            local_ttl: Seconds a tier-1 entry is trusted
+            ttl: Seconds a value stays in Redis
+        """
+        self.namespace = namespace
+        self.client = client
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.channel = f"cache:{namespace}:invalidate"
+        # Tells this process's own messages apart from other processes'
+        self.instance_id = uuid.uuid4().hex
+        self._local: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a fill that raced with one is dropped
+        self._generation = 0
+        self._counts = {"local_hits": 0, "local_misses": 0, "redis_hits": 0, "redis_misses": 0,
+                        "loads": 0, "evictions": 0, "invalidations": 0}
+        self._stop = threading.Event()
+        # Set while the listener is subscribed
+        self.ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _count(self, name: str, tier: str, result: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+        REQUESTS_TOTAL.inc((self.namespace, tier, result))
+
+    def _get_local(self, key: str) -> Any:
+        expired = False
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._local[key]
+                entry, expired = None, True
+            if entry is not None:
+                self._local.move_to_end(key)
+        if expired:
+            LOCAL_ENTRIES.dec((self.namespace,))
+        if entry is None:
+            self._count("local_misses", "local", "miss")
+            return _MISSING
+        self._count("local_hits", "local", "hit")
+        return entry[0]
+
+    def _put_local(self, key: str, value: Any, generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            before = len(self._local)
+            self._local[key] = (value, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self._counts["evictions"] += 1
+            added = len(self._local) - before
+        LOCAL_ENTRIES.inc((self.namespace,), added)
+
+    def _evict_local(self, key: Optional[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            before = len(self._local)
+            if key is None:
+                self._local.clear()
+            else:
+                self._local.pop(key, None)
+            removed = before - len(self._local)
+        LOCAL_ENTRIES.dec((self.namespace,), removed)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look a key up in tier 1, then in Redis.
+
+        Returns:
+            The value, or None if neither tier has it
+        """
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+        if self.client is None:
+            return None
+        generation = self._generation
+        try:
+            raw = self.client.get(self.redis_key(key))
+        except redis.RedisError as err:
+            print(f"Cache {self.namespace}: Redis unavailable ({err})")
+            return None
+        if raw is None:
+            self._count("redis_misses", "redis", "miss")
+            return None
+        self._count("redis_hits", "redis", "hit")
+        value = json.loads(raw)
+        self._put_local(key, value, generation)
+        return value
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Optional[Any]:
+        """
+        Look a key up in both tiers, loading and storing it on a miss.
+
+        Args:
+            key: Cache key
+            loader: Called with no arguments on a miss; None isn't cached
+
+        Returns:
+            The cached or loaded value
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            self._counts["loads"] += 1
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value in both tiers and invalidate it elsewhere."""
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.set(self.redis_key(key), json.dumps(value), ex=int(self.ttl))
+                pipe.publish(self.channel, self._message(key))
+                pipe.execute()
+            except redis.RedisError as err:
+                print(f"Cache {self.namespace}: Redis unavailable ({err})")
+        self._put_local(key, value)
+
+    def delete(self, key: str) -> None:
+        """Remove a key from both tiers, in every process."""
+        self._evict_local(key)
+        if self.client is not None:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.delete(self.redis_key(key))
+                pipe.publish(self.channel, self._message(key))
+                pipe.execute()
+            except redis.RedisError as err:
+                print(f"Cache {self.namespace}: Redis unavailable ({err})")
+
+    def clear(self) -> int:
+        """
+        Remove every key of this cache from both tiers, in every process.
+
+        Tier 1 of this process is cleared even if Redis fails.
+
+        Returns:
+            Number of keys removed from Redis
+
+        Raises:
+            redis.RedisError: If Redis could not be cleared or the other
+                processes could not be told
+        """
+        self._evict_local(None)
+        if self.client is None:
+            return 0
+        removed = delete_matching(self.client, self.redis_key("*"))
+        self.client.publish(self.channel, self._message(None))
+        return removed
+
+    def _message(self, key: Optional[str]) -> str:
+        return json.dumps({"origin": self.instance_id, "key": key})
+
+    def _handle_message(self, data) -> None:
+        message = json.loads(data)
+        if message.get("origin") == self.instance_id:
+            return
+        with self._lock:
+            self._counts["invalidations"] += 1
+        self._evict_local(message.get("key"))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get lookup counts and hit ratios per tier.
+
+        The Redis tier only sees lookups that missed tier 1.
+
+        Returns:
+            Dictionary with "local", "redis" and "overall" figures, plus
+            loads, evictions and invalidations received
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._local)
+        requests = counts["local_hits"] + counts["local_misses"]
+        hits = counts["local_hits"] + counts["redis_hits"]
+        return {
+            "local": {"hits": counts["local_hits"], "misses": counts["local_misses"],
+                      "hit_ratio": _ratio(counts["local_hits"], counts["local_misses"]),
+                      "entries": entries, "max_entries": self.max_entries},
+            "redis": {"hits": counts["redis_hits"], "misses": counts["redis_misses"],
+                      "hit_ratio": _ratio(counts["redis_hits"], counts["redis_misses"]),
+                      "enabled": self.client is not None},
+            "overall": {"requests": requests, "hit_ratio": _ratio(hits, requests - hits)},
+            "loads": counts["loads"],
+            "evictions": counts["evictions"],
+            "invalidations": counts["invalidations"],
+        }
+
+    def start(self) -> None:
+        """Start the background invalidation listener thread."""
+        if self.client is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_loop, name=f"cache-{self.namespace}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.ready.clear()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _listen_loop(self) -> None:
+        while not self._stop.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Messages may have been missed while unsubscribed
+                self._evict_local(None)
+                self.ready.set()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._handle_message(message["data"])
+            except redis.RedisError as err:
+                self.ready.clear()
+                print(f"Cache {self.namespace}: invalidation listener failed ({err})")
+                self._stop.wait(5.0)
+            finally:
+                # Returns the connection, whether the loop stopped or failed
+                pubsub.close()
@@ -0,0 +1,385 @@
+"""
+Tracing for Lab 8
+=================
+
+This module provides a small OpenTelemetry-style tracer used by the FastAPI
+app, database_utils and the CLI driver to show where time goes across
+FastAPI, MySQL, Redis, MinIO and SMTP calls.
+
+- Spans form parent/child trees through a context variable, so nested
+  calls (including work run in FastAPI's threadpool) attach to the span
+  that was active when they started.
+- Trace context crosses process boundaries with the W3C `traceparent`
+  header: the CLI driver sends it and the FastAPI middleware continues it.
+- Finished spans go to an exporter: an in-memory collector (useful in
+  tests) or a JSON-lines file with one span per line.
+
+Tracing is off unless an exporter is configured, either in code with
+configure_tracing() or with the TRACE_EXPORT environment variable
+("memory" or "file:<path>"). When off, spans are no-ops.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._start_perf = time.perf_counter_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.attributes["error.type"] = type(error).__name__
+        self.attributes["error.message"] = str(error)
+
+    def end(self) -> None:
+        # Wall-clock start plus a monotonic duration, so clock jumps don't
+        # produce negative spans
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._start_perf)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or self.start_ns) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service.name": SERVICE_NAME,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled."""
+
+    trace_id = span_id = parent_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class InMemoryExporter:
+    """Collects finished spans in a list."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class FileExporter:
+    """Appends finished spans to a file as JSON lines."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "lab8")
+_exporter = None
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def configure_tracing(exporter) -> None:
+    """
+    Enable tracing with the given exporter, or disable it with None.
+
+    Args:
+        exporter: Object with an export(span) method, e.g. InMemoryExporter()
+    """
+    global _exporter
+    _exporter = exporter
+
+
+def configure_from_env() -> None:
+    """Configure tracing from the TRACE_EXPORT environment variable."""
+    setting = os.environ.get("TRACE_EXPORT", "")
+    if setting == "memory":
+        configure_tracing(InMemoryExporter())
+    elif setting.startswith("file:"):
+        configure_tracing(FileExporter(setting[len("file:"):]))
+
+
+def get_exporter():
+    """Get the active exporter, or None when tracing is disabled."""
+    return _exporter
+
+
+def current_span():
+    """Get the active span (a no-op span when none is active)."""
+    return _current_span.get() or _NOOP_SPAN
+
+
+@contextmanager
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None, kind: str = "internal",
+               parent: Optional[Dict[str, str]] = None) -> Iterator[Any]:
+    """
+    Run a block of code inside a new span.
+
+    Args:
+        name: Span name, e.g. "mysql.execute"
+        attributes: Initial span attributes
+        kind: "server", "client" or "internal"
+        parent: Remote parent from extract_traceparent(); defaults to the active span
+
+    Yields:
+        The new span
+    """
+    if _exporter is None:
+        yield _NOOP_SPAN
+        return
+
+    active = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent["trace_id"], parent["span_id"]
+    elif active is not None:
+        trace_id, parent_id = active.trace_id, active.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    span = Span(name, trace_id, parent_id, kind, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as error:
+        span.record_error(error)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        _exporter.export(span)
+
+
+def traced(name: Optional[str] = None, kind: str = "internal") -> Callable:
+    """
+    Decorator that runs every call of a function inside a span.
+
+    Works for both regular and async functions.
+
+    Args:
+        name: Span name; defaults to the function's qualified name
+        kind: Span kind
+
+    Returns:
+        Decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _exporter is None:
+                    return await func(*args, **kwargs)
+                with start_span(span_name, kind=kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return func(*args, **kwargs)
+            with start_span(span_name, kind=kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject_traceparent(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Add a W3C traceparent header for the active span to a header dict.
+
+    Args:
+        headers: Existing headers (not modified)
+
+    Returns:
+        New header dict, with traceparent added if a span is active
+    """
+    headers = dict(headers or {})
+    span = _current_span.get()
+    if span is not None:
+        headers["traceparent"] = f"00-{span.trace_id}-{span.span_id}-01"
+    return headers
+
+
+def extract_traceparent(value: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Parse a W3C traceparent header value.
+
+    Args:
+        value: Header value, e.g. "00-<32 hex>-<16 hex>-01"
+
+    Returns:
+        Dictionary with 'trace_id' and 'span_id', or None if invalid
+    """
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return {"trace_id": parts[1], "span_id": parts[2]}
+
+
+class TracedClient:
+    """
+    Proxy that runs every method call on a client object inside a span.
+
+    Used for the Redis, MinIO and SMTP clients, e.g.
+    TracedClient(redis.Redis(...), "redis") records "redis.set", "redis.get"...
+    """
+
+    def __init__(self, client: Any, prefix: str):
+        self._client = client
+        self._prefix = prefix
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._client, attr)
+        if _exporter is None or not callable(value) or attr.startswith("_"):
+            return value
+
+        if attr == "pipeline":
+            # Queued commands only run on execute(), so that's what is traced
+            @functools.wraps(value)
+            def open_pipeline(*args, **kwargs):
+                return TracedPipeline(value(*args, **kwargs), f"{self._prefix}.pipeline")
+            return open_pipeline
+
+        @functools.wraps(value)
+        def wrapper(*args, **kwargs):
+            with start_span(f"{self._prefix}.{attr}", kind="client"):
+                return value(*args, **kwargs)
+        return wrapper
+
+
+class TracedPipeline:
+    """
+    Proxy for a client pipeline (e.g. redis.Redis.pipeline()) that records
+    execute() as one client span, with the number of queued commands.
+    """
+
+    def __init__(self, pipeline: Any, name: str):
+        self._pipeline = pipeline
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._pipeline, attr)
+        if not callable(value) or attr.startswith("_"):
+            return value
+
+        @functools.wraps(value)
+        def wrapper(*args, **kwargs):
+            result = value(*args, **kwargs)
+            # Queueing a command returns the pipeline, for chaining
+            return self if result is self._pipeline else result
+        return wrapper
+
+    def execute(self, *args, **kwargs) -> Any:
+        with start_span(self._name, {"db.command_count": len(self._pipeline)}, kind="client"):
+            return self._pipeline.execute(*args, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._pipeline)
+
+    def __enter__(self) -> "TracedPipeline":
+        self._pipeline.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> Any:
+        return self._pipeline.__exit__(*exc_info)
+
+
+class TracingMiddleware:
+    """ASGI middleware that wraps each HTTP request in a server span."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for header, value in scope["headers"]:
+            if header == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with start_span(f"{scope['method']} {scope['path']}", attributes, kind="server",
+                        parent=extract_traceparent(traceparent)) as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.status = "error"
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Rename to the route template once the router has matched
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"{scope['method']} {route}"
+                    span.set_attribute("http.route", route)
+
+
+configure_from_env()